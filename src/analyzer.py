@@ -1,21 +1,104 @@
+import threading
 import tweepy
-import time
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Set
+
+from matcher import get_matcher
+from query import DEFAULT_MAX_QUERY_LENGTH, plan_queries
+from metrics import METRICS
+from ratelimit import DEFAULT_RATE_LIMITER, RateLimiter, endpoint_key
+from records import Tweet
+from transport import Transport
+
+# get_users accepts at most 100 usernames per request
+USERS_LOOKUP_BATCH_SIZE = 100
+# get_users_tweets returns at most 100 tweets per page
+TIMELINE_PAGE_SIZE = 100
+
+
+# consecutive 429 responses tolerated for one request before giving up
+MAX_RATE_LIMIT_RETRIES = 3
+
+
+class RateLimitedClient(tweepy.Client):
+    """
+    tweepy client that reports every response's rate-limit headers to a shared
+    RateLimiter and waits on it before each request, instead of sleeping blindly.
+    """
+
+    def __init__(self, *args, rate_limiter: RateLimiter = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter or DEFAULT_RATE_LIMITER
+
+    def request(self, method, route, params=None, json=None, user_auth=False):
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            self.rate_limiter.acquire(route)
+            try:
+                # one span per http call, e.g. every search page fetch
+                with METRICS.span(f"x_request {endpoint_key(route)}"):
+                    response = super().request(method, route, params=params, json=json, user_auth=user_auth)
+            except tweepy.TooManyRequests as e:
+                self.rate_limiter.update(route, e.response.headers, exhausted=True)
+                if attempt == MAX_RATE_LIMIT_RETRIES:
+                    raise
+                continue
+            self.rate_limiter.update(route, response.headers)
+            return response
 
 
 class TwitterSearcher:
-    def __init__(self, bearer_token):
-        self.client = tweepy.Client(bearer_token=bearer_token)
+    def __init__(self, bearer_token, max_query_length: int = DEFAULT_MAX_QUERY_LENGTH,
+                 rate_limiter: RateLimiter = None, search_workers: int = 4, transport: Transport = None):
+        """
+        args:
+            bearer_token: x api bearer token
+            max_query_length: search query length limit of the api access level
+            rate_limiter: shared RateLimiter (default: the process-wide one)
+            search_workers: concurrent per-keyword searches in the fallback path
+            transport: shared Transport whose pooled x session the client uses (default: tweepy's own session)
+        """
+        self.client = RateLimitedClient(bearer_token=bearer_token, rate_limiter=rate_limiter)
+        if transport is not None:
+            self.client.session = transport.x_session
+        self.max_query_length = max_query_length
+        self.search_workers = max(1, search_workers)
+        # lowercased username -> user id, filled by user lookups
+        self._user_ids: Dict[str, int] = {}
+        # lowercased usernames whose current scan lost pages to an error (see search_complete)
+        self._incomplete: Set[str] = set()
+        self._incomplete_lock = threading.Lock()
+
+    def _start_scan(self, username: str):
+        with self._incomplete_lock:
+            self._incomplete.discard(username.lower())
+
+    def _mark_incomplete(self, username: str):
+        with self._incomplete_lock:
+            self._incomplete.add(username.lower())
+
+    def search_complete(self, username: str) -> bool:
+        """
+        whether the latest scan of a profile fetched every page.
+        false once any search or timeline request for it failed or was given up on, so callers
+        know the tweets they got may have gaps (e.g. before resuming a later scan after them).
+        args:
+            username: Twitter username (without @)
+        returns:
+            bool: True if no page was lost
+        """
+        with self._incomplete_lock:
+            return username.lower() not in self._incomplete
 
-    def search_tweets_by_keyword(self, username: str, keyword: str) -> List[Dict]:
+    def search_tweets_by_keyword(self, username: str, keyword: str, since_id: int = None) -> List[Tweet]:
         """
         search for tweets from a specific user containing a keyword.
         uses twitter api v2 search_recent_tweets endpoint with pagination.
         args:
             username: Twitter username (without @)
             keyword: keyword to search for
+            since_id: only return tweets newer than this id (incremental scans)
         returns:
-            list of tweet dictionaries with text, id, created_at, and public_metrics
+            list of Tweet records (matched_keywords is [keyword])
         """
         all_tweets = []
         query = f"from:{username} {keyword}"
@@ -26,29 +109,12 @@ class TwitterSearcher:
                 query=query,
                 max_results=100,
                 tweet_fields=['created_at', 'public_metrics', 'text'],
-                expansions=['author_id']
+                expansions=['author_id'],
+                since_id=since_id
             )
-            print("response: ", response)
-            print("response.data: ", response.data)
             if response.data:
                 for tweet in response.data:
-                    # extract public metrics safely
-                    metrics = {}
-                    if tweet.public_metrics:
-                        metrics = {
-                            'like_count': getattr(tweet.public_metrics, 'like_count', 0),
-                            'retweet_count': getattr(tweet.public_metrics, 'retweet_count', 0),
-                            'reply_count': getattr(tweet.public_metrics, 'reply_count', 0),
-                            'quote_count': getattr(tweet.public_metrics, 'quote_count', 0)
-                        }
-                    
-                    all_tweets.append({
-                        'id': tweet.id,
-                        'text': tweet.text,
-                        'created_at': tweet.created_at.isoformat() if tweet.created_at else None,
-                        'public_metrics': metrics,
-                        'keyword': keyword
-                    })
+                    all_tweets.append(Tweet.from_api(tweet, [keyword]))
             
             # handle pagination
             next_token = response.meta.get('next_token') if response.meta else None
@@ -59,87 +125,146 @@ class TwitterSearcher:
                         max_results=100,
                         tweet_fields=['created_at', 'public_metrics', 'text'],
                         expansions=['author_id'],
+                        since_id=since_id,
                         next_token=next_token
                     )
                     
                     if response.data:
                         for tweet in response.data:
-                            # extract public metrics safely
-                            metrics = {}
-                            if tweet.public_metrics:
-                                metrics = {
-                                    'like_count': getattr(tweet.public_metrics, 'like_count', 0),
-                                    'retweet_count': getattr(tweet.public_metrics, 'retweet_count', 0),
-                                    'reply_count': getattr(tweet.public_metrics, 'reply_count', 0),
-                                    'quote_count': getattr(tweet.public_metrics, 'quote_count', 0)
-                                }
-                            
-                            all_tweets.append({
-                                'id': tweet.id,
-                                'text': tweet.text,
-                                'created_at': tweet.created_at.isoformat() if tweet.created_at else None,
-                                'public_metrics': metrics,
-                                'keyword': keyword
-                            })
+                            all_tweets.append(Tweet.from_api(tweet, [keyword]))
                     
                     next_token = response.meta.get('next_token') if response.meta else None
-                    
-                    # rate limit handling - wait if needed
-                    if response.meta and response.meta.get('remaining', 0) == 0:
-                        time.sleep(60)  # wait 1 minute if rate limited
-                        
+
                 except tweepy.TooManyRequests:
-                    # rate limit exceeded, wait and retry
-                    time.sleep(60)
-                    continue
+                    # the client already waited out the window and retried; stop instead of looping
+                    print(f"Rate limit still exceeded after {MAX_RATE_LIMIT_RETRIES} retries, "
+                          f"stopping search for keyword '{keyword}'.")
+                    self._mark_incomplete(username)
+                    break
                 except Exception as e:
                     print(f"Error during pagination for keyword '{keyword}': {e}")
+                    self._mark_incomplete(username)
                     break
                     
         except tweepy.TooManyRequests:
-            print(f"Rate limit exceeded for keyword '{keyword}'. Waiting 60 seconds...")
-            time.sleep(60)
+            print(f"Rate limit exceeded for keyword '{keyword}'.")
+            self._mark_incomplete(username)
         except tweepy.NotFound:
             print(f"User '{username}' not found or no tweets found for keyword '{keyword}'")
         except Exception as e:
             print(f"Error searching tweets for keyword '{keyword}': {e}")
+            self._mark_incomplete(username)
         
         return all_tweets
 
-    def search_tweets_by_keywords_batch(self, username: str, keywords: List[str]) -> List[Dict]:
+    def search_tweets_by_keywords_parallel(self, username: str, keywords: List[str],
+                                           since_id: int = None) -> Iterator[List[Tweet]]:
+        """
+        run one search per keyword on a bounded worker pool (the fallback when OR-queries fail).
+        all workers share the client's rate limiter. each keyword's tweets are yielded as soon as
+        its search finishes, so analysis starts while the other keywords are still searching.
+        tweets already yielded for an earlier keyword are dropped, and matched keywords are
+        attributed from the tweet text, so the first copy of a tweet carries every keyword it contains.
+        args:
+            username: Twitter username (without @)
+            keywords: keywords to search for
+            since_id: only return tweets newer than this id (incremental scans)
+        returns:
+            iterator of pages, one per keyword with new tweets, each a list of Tweet records
+        """
+        keywords = list(dict.fromkeys(keywords))
+        position = {keyword: idx for idx, keyword in enumerate(keywords)}
+        matcher = get_matcher(keywords)
+        seen_ids = set()
+        with ThreadPoolExecutor(max_workers=self.search_workers) as executor:
+            futures = {executor.submit(self.search_tweets_by_keyword, username, keyword, since_id): keyword
+                       for keyword in keywords}
+            for done, future in enumerate(as_completed(futures), 1):
+                keyword = futures[future]
+                keyword_tweets = future.result()
+                print(f"[{done}/{len(keywords)}] keyword '{keyword}': found {len(keyword_tweets)} tweet(s)")
+                page = []
+                for tweet in keyword_tweets:
+                    if tweet.id in seen_ids:
+                        continue
+                    seen_ids.add(tweet.id)
+                    # the search matched keyword even where the text match does not (e.g. a #hashtag form)
+                    matched_keywords = matcher.find(tweet.text)
+                    if keyword not in matched_keywords:
+                        matched_keywords = sorted(matched_keywords + [keyword], key=position.get)
+                    tweet.matched_keywords = matched_keywords
+                    page.append(tweet)
+                if page:
+                    yield page
+
+    def search_tweets_by_keywords_batch(self, username: str, keywords: List[str],
+                                        since_id: int = None) -> List[Tweet]:
         """
         search for tweets from a specific user containing any of the provided keywords.
         uses twitter api v2 search_recent_tweets endpoint with OR operators for batch search.
-        this is more efficient than multiple separate searches.
+        keywords are packed into the fewest queries that fit max_query_length and results
+        are merged by tweet id. this is more efficient than multiple separate searches.
 
         args:
             username: Twitter username (without @)
             keywords: list of keywords to search for
+            since_id: only return tweets newer than this id (incremental scans)
     
         returns:
-            list of tweet dictionaries with text, id, created_at, public_metrics, and matched_keywords
+            list of Tweet records with matched_keywords
         """
-        all_tweets = []
-        
-        # build query with OR operators: from:username (keyword1 OR keyword2 OR ...)
-        # escape keywords that might contain special characters
-        escaped_keywords = []
-        for keyword in keywords:
-            # wrap in quotes if keyword contains spaces or special characters
-            if ' ' in keyword or any(char in keyword for char in ['"', "'", '(', ')']):
-                escaped_keyword = f'"{keyword}"'
-            else:
-                escaped_keyword = keyword
-            escaped_keywords.append(escaped_keyword)
+        # duplicates across queries are dropped by iter_tweet_pages; matched_keywords come
+        # from the full keyword list, so the first copy of a tweet already has them all
+        tweets = [tweet for page in self.iter_tweet_pages(username, keywords, since_id) for tweet in page]
         
-        # combine keywords with OR operator
-        keywords_query = ' OR '.join(escaped_keywords)
-        query = f"from:{username} ({keywords_query})"
+        # newest first, matching the order a single query returns
+        return sorted(tweets, key=lambda tweet: tweet.id, reverse=True)
+
+    def iter_tweet_pages(self, username: str, keywords: List[str],
+                         since_id: int = None) -> Iterator[List[Tweet]]:
+        """
+        stream the batch search one result page at a time.
+        runs the planned OR-queries in turn and drops tweets already yielded by an
+        earlier query, so analysis can start on page 1 while later pages are still
+        being fetched and only one page is held by the searcher at a time.
+
+        args:
+            username: Twitter username (without @)
+            keywords: list of keywords to search for
+            since_id: only return tweets newer than this id (incremental scans)
+    
+        returns:
+            iterator of pages, each a list of Tweet records with matched_keywords
+        """
+        self._start_scan(username)
+        # pack keywords into as few OR-queries as fit the query length limit
+        queries = plan_queries(username, keywords, self.max_query_length)
+        print(f"executing batch search with {len(keywords)} keywords in {len(queries)} query(ies)...")
         
-        print("keywords query:")
-        print(keywords_query)
-        print(f"query: {query}")
-        print(f"executing batch search query with {len(keywords)} keywords...")
+        seen_ids = set()
+        for query, query_keywords in queries:
+            print(f"query ({len(query_keywords)} keywords): {query}")
+            for page in self._iter_query_pages(username, query, keywords, since_id):
+                page = [tweet for tweet in page if tweet.id not in seen_ids]
+                seen_ids.update(tweet.id for tweet in page)
+                if page:
+                    yield page
+
+    def _iter_query_pages(self, username: str, query: str, keywords: List[str],
+                          since_id: int = None) -> Iterator[List[Tweet]]:
+        """
+        run one paginated search query and attribute matched keywords to each tweet.
+        pages are yielded as soon as they arrive, so the next page is only requested
+        once the caller asks for it.
+        args:
+            username: Twitter username (without @)
+            query: full search query
+            keywords: keywords to attribute to returned tweets
+            since_id: only return tweets newer than this id
+        returns:
+            iterator of pages, each a list of Tweet records with matched_keywords
+        """
+        matcher = get_matcher(keywords)
         
         try:
             # initial search
@@ -147,35 +272,19 @@ class TwitterSearcher:
                 query=query,
                 max_results=100,
                 tweet_fields=['created_at', 'public_metrics', 'text'],
-                expansions=['author_id']
+                expansions=['author_id'],
+                since_id=since_id
             )
             
+            page = []
             if response.data:
                 for tweet in response.data:
-                    # determine which keywords matched this tweet (case-insensitive)
-                    matched_keywords = []
-                    tweet_text_lower = tweet.text.lower()
-                    for keyword in keywords:
-                        if keyword.lower() in tweet_text_lower:
-                            matched_keywords.append(keyword)
-                    
-                    # extract public metrics safely
-                    metrics = {}
-                    if tweet.public_metrics:
-                        metrics = {
-                            'like_count': getattr(tweet.public_metrics, 'like_count', 0),
-                            'retweet_count': getattr(tweet.public_metrics, 'retweet_count', 0),
-                            'reply_count': getattr(tweet.public_metrics, 'reply_count', 0),
-                            'quote_count': getattr(tweet.public_metrics, 'quote_count', 0)
-                        }
+                    # determine which keywords matched this tweet (whole words, case-insensitive)
+                    matched_keywords = matcher.find(tweet.text)
                     
-                    all_tweets.append({
-                        'id': tweet.id,
-                        'text': tweet.text,
-                        'created_at': tweet.created_at.isoformat() if tweet.created_at else None,
-                        'public_metrics': metrics,
-                        'matched_keywords': matched_keywords  # list of keywords that matched
-                    })
+                    page.append(Tweet.from_api(tweet, matched_keywords))
+            if page:
+                yield page
             
             # handle pagination
             next_token = response.meta.get('next_token') if response.meta else None
@@ -186,53 +295,35 @@ class TwitterSearcher:
                         max_results=100,
                         tweet_fields=['created_at', 'public_metrics', 'text'],
                         expansions=['author_id'],
+                        since_id=since_id,
                         next_token=next_token
                     )
                     
+                    page = []
                     if response.data:
                         for tweet in response.data:
                             # determine which keywords matched this tweet
-                            matched_keywords = []
-                            tweet_text_lower = tweet.text.lower()
-                            for keyword in keywords:
-                                if keyword.lower() in tweet_text_lower:
-                                    matched_keywords.append(keyword)
+                            matched_keywords = matcher.find(tweet.text)
                             
-                            # extract public metrics safely
-                            metrics = {}
-                            if tweet.public_metrics:
-                                metrics = {
-                                    'like_count': getattr(tweet.public_metrics, 'like_count', 0),
-                                    'retweet_count': getattr(tweet.public_metrics, 'retweet_count', 0),
-                                    'reply_count': getattr(tweet.public_metrics, 'reply_count', 0),
-                                    'quote_count': getattr(tweet.public_metrics, 'quote_count', 0)
-                                }
-                            
-                            all_tweets.append({
-                                'id': tweet.id,
-                                'text': tweet.text,
-                                'created_at': tweet.created_at.isoformat() if tweet.created_at else None,
-                                'public_metrics': metrics,
-                                'matched_keywords': matched_keywords
-                            })
+                            page.append(Tweet.from_api(tweet, matched_keywords))
+                    if page:
+                        yield page
                     
                     next_token = response.meta.get('next_token') if response.meta else None
-                    
-                    # rate limit handling - wait if needed
-                    if response.meta and response.meta.get('remaining', 0) == 0:
-                        time.sleep(60)  # wait 1 minute if rate limited
-                        
+
                 except tweepy.TooManyRequests:
-                    # rate limit exceeded, wait and retry
-                    time.sleep(60)
-                    continue
+                    # the client already waited out the window and retried; stop instead of looping
+                    print(f"rate limit still exceeded after {MAX_RATE_LIMIT_RETRIES} retries, stopping query.")
+                    self._mark_incomplete(username)
+                    break
                 except Exception as e:
                     print(f"error during pagination: {e}")
+                    self._mark_incomplete(username)
                     break
                     
         except tweepy.TooManyRequests:
-            print(f"rate limit exceeded. waiting 60 seconds...")
-            time.sleep(60)
+            print(f"rate limit exceeded.")
+            self._mark_incomplete(username)
         except tweepy.BadRequest as e:
             # query might be too long, fall back to individual searches
             print(f"batch query failed (possibly too long): {e}")
@@ -241,8 +332,7 @@ class TwitterSearcher:
             print(f"user '{username}' not found or no tweets found")
         except Exception as e:
             print(f"error searching tweets: {e}")
-        
-        return all_tweets
+            self._mark_incomplete(username)
 
     def validate_user(self, username: str) -> bool:
         """
@@ -253,10 +343,106 @@ class TwitterSearcher:
             bool: True if user exists, False otherwise
         """
         try:
-            user_response = self.client.get_user(username=username)
-            return user_response.data is not None
+            with METRICS.span('validate_user'):
+                user_response = self.client.get_user(username=username)
+            if user_response.data is None:
+                return False
+            self._user_ids[username.lower()] = user_response.data.id
+            return True
         except tweepy.NotFound:
             return False
         except Exception as e:
             print(f"Error validating user '{username}': {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def validate_users(self, usernames: List[str]) -> Set[str]:
+        """
+        validate many twitter users with bulk lookups (100 usernames per request).
+        args:
+            usernames: Twitter usernames (without @)
+        returns:
+            set of lowercased usernames that exist
+        """
+        found = set()
+        for start in range(0, len(usernames), USERS_LOOKUP_BATCH_SIZE):
+            chunk = usernames[start:start + USERS_LOOKUP_BATCH_SIZE]
+            try:
+                with METRICS.span('validate_user'):
+                    users_response = self.client.get_users(usernames=chunk)
+            except Exception as e:
+                print(f"Error validating users {chunk[0]}..{chunk[-1]}: {e}")
+                continue
+            for user in users_response.data or []:
+                found.add(user.username.lower())
+                self._user_ids[user.username.lower()] = user.id
+        return found
+
+    def get_user_id(self, username: str) -> Optional[int]:
+        """
+        numeric id of a user (needed by the timeline endpoint), looked up once and remembered.
+        args:
+            username: Twitter username (without @)
+        returns:
+            user id, or None if the user does not exist
+        """
+        if username.lower() not in self._user_ids and not self.validate_user(username):
+            return None
+        return self._user_ids[username.lower()]
+
+    def iter_timeline_pages(self, username: str, keywords: List[str],
+                            since_id: int = None) -> Iterator[List[Tweet]]:
+        """
+        harvest the user's own timeline and match keywords locally.
+        pages through get_users_tweets once (100 tweets per page) instead of running
+        keyword searches, so there are no query length limits or per-keyword fallback,
+        and tweets older than the 7-day search window are reached too (the endpoint
+        serves up to the 3200 most recent tweets).
+        args:
+            username: Twitter username (without @)
+            keywords: keywords to match
+            since_id: only return tweets newer than this id (incremental scans)
+        returns:
+            iterator of pages, each a list of the page's Tweet records that matched a keyword
+        """
+        self._start_scan(username)
+        user_id = self.get_user_id(username)
+        if user_id is None:
+            print(f"user '{username}' not found")
+            return
+        matcher = get_matcher(keywords)
+        
+        scanned = 0
+        pagination_token = None
+        while True:
+            try:
+                response = self.client.get_users_tweets(
+                    id=user_id,
+                    max_results=TIMELINE_PAGE_SIZE,
+                    tweet_fields=['created_at', 'public_metrics', 'text'],
+                    since_id=since_id,
+                    pagination_token=pagination_token
+                )
+            except tweepy.TooManyRequests:
+                # the client already waited out the window and retried; stop instead of looping
+                print(f"rate limit still exceeded after {MAX_RATE_LIMIT_RETRIES} retries, "
+                      f"stopping timeline after {scanned} tweet(s).")
+                self._mark_incomplete(username)
+                return
+            except Exception as e:
+                print(f"error reading timeline: {e}")
+                self._mark_incomplete(username)
+                return
+            
+            page = []
+            for tweet in response.data or []:
+                matched_keywords = matcher.find(tweet.text)
+                if matched_keywords:
+                    page.append(Tweet.from_api(tweet, matched_keywords))
+            scanned += len(response.data or [])
+            print(f"timeline: scanned {scanned} tweet(s)")
+            if page:
+                yield page
+            
+            pagination_token = response.meta.get('next_token') if response.meta else None
+            if not pagination_token:
+                return
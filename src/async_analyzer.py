@@ -0,0 +1,229 @@
+"""
+async twitter searcher.
+the same searches as analyzer.TwitterSearcher, built on tweepy's AsyncClient so
+profile lookups and search pages from many profiles can be in flight at once on
+one event loop. results come back as async iterators of Tweet records.
+tweepy's async client needs aiohttp (pip install "tweepy[async]"); it is only
+imported when an AsyncTwitterSearcher is created.
+"""
+
+import asyncio
+import tweepy
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List
+
+from analyzer import MAX_RATE_LIMIT_RETRIES
+from matcher import get_matcher
+from metrics import METRICS
+from query import DEFAULT_MAX_QUERY_LENGTH, plan_queries
+from ratelimit import DEFAULT_RATE_LIMITER, RateLimiter, endpoint_key
+from records import Tweet
+
+# open connections shared by every request of one searcher
+DEFAULT_MAX_CONNECTIONS = 100
+
+
+@lru_cache(maxsize=None)
+def _async_client_class():
+    # the base class only exists once tweepy's async extras import, so the subclass is built on first use
+    try:
+        import aiohttp
+        from tweepy.asynchronous import AsyncClient
+    except ImportError as e:
+        raise ImportError(
+            f"AsyncTwitterSearcher needs tweepy's async extras ({e.name or e} is missing). "
+            "install them with: pip install \"tweepy[async]\""
+        ) from e
+
+    class RateLimitedAsyncClient(AsyncClient):
+        """
+        async counterpart of analyzer.RateLimitedClient: waits on the shared RateLimiter
+        with asyncio.sleep before each request and reports every response's headers to it.
+        all requests go through one aiohttp session whose connector caps open connections.
+        """
+
+        def __init__(self, *args, rate_limiter: RateLimiter = None,
+                     max_connections: int = DEFAULT_MAX_CONNECTIONS, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.rate_limiter = rate_limiter or DEFAULT_RATE_LIMITER
+            self.max_connections = max_connections
+
+        async def request(self, method, route, params=None, json=None, user_auth=False):
+            if self.session is None:
+                # created lazily because an aiohttp session must be opened inside the running loop
+                self.session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=self.max_connections))
+            for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+                while True:
+                    wait = self.rate_limiter.reserve(route)
+                    if wait <= 0:
+                        break
+                    self.rate_limiter.record_wait(route, wait)
+                    await asyncio.sleep(wait)
+                try:
+                    # one span per http call, e.g. every search page fetch
+                    with METRICS.span(f"x_request {endpoint_key(route)}"):
+                        response = await super().request(method, route, params=params, json=json,
+                                                         user_auth=user_auth)
+                except tweepy.TooManyRequests as e:
+                    self.rate_limiter.update(route, e.response.headers, exhausted=True)
+                    if attempt == MAX_RATE_LIMIT_RETRIES:
+                        raise
+                    continue
+                self.rate_limiter.update(route, response.headers)
+                return response
+
+        async def close(self):
+            if self.session is not None:
+                await self.session.close()
+                self.session = None
+
+    return RateLimitedAsyncClient
+
+
+class AsyncTwitterSearcher:
+    def __init__(self, bearer_token, max_query_length: int = DEFAULT_MAX_QUERY_LENGTH,
+                 rate_limiter: RateLimiter = None, max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        """
+        args:
+            bearer_token: x api bearer token
+            max_query_length: search query length limit of the api access level
+            rate_limiter: shared RateLimiter (default: the process-wide one, shared with sync searchers)
+            max_connections: open connections to the api at once; further requests queue on the loop
+        """
+        self.client = _async_client_class()(bearer_token=bearer_token, rate_limiter=rate_limiter,
+                                            max_connections=max_connections)
+        self.max_query_length = max_query_length
+        # lowercased username -> user id, filled by user lookups
+        self._user_ids: Dict[str, int] = {}
+
+    async def __aenter__(self) -> 'AsyncTwitterSearcher':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """close the shared http session (call once the loop is done with the searcher)."""
+        await self.client.close()
+
+    async def validate_user(self, username: str) -> bool:
+        """
+        validate that a twitter user exists.
+        args:
+            username: Twitter username (without @)
+        returns:
+            bool: True if user exists, False otherwise
+        """
+        try:
+            with METRICS.span('validate_user'):
+                user_response = await self.client.get_user(username=username)
+            if user_response.data is None:
+                return False
+            self._user_ids[username.lower()] = user_response.data.id
+            return True
+        except tweepy.NotFound:
+            return False
+        except Exception as e:
+            print(f"Error validating user '{username}': {e}")
+            return False
+
+    async def search_tweets_by_keyword(self, username: str, keyword: str,
+                                       since_id: int = None) -> AsyncIterator[Tweet]:
+        """
+        search for tweets from a specific user containing a keyword.
+        args:
+            username: Twitter username (without @)
+            keyword: keyword to search for
+            since_id: only return tweets newer than this id (incremental scans)
+        returns:
+            async iterator of Tweet records (matched_keywords is [keyword]), page by page
+        """
+        query = f"from:{username} {keyword}"
+        try:
+            async for page in self._iter_query_pages(query, since_id):
+                for tweet in page:
+                    yield Tweet.from_api(tweet, [keyword])
+        except tweepy.BadRequest as e:
+            print(f"Error searching tweets for keyword '{keyword}': {e}")
+
+    async def search_tweets_by_keywords_batch(self, username: str, keywords: List[str],
+                                              since_id: int = None) -> AsyncIterator[Tweet]:
+        """
+        search for tweets from a specific user containing any of the provided keywords.
+        keywords are packed into the fewest OR-queries that fit max_query_length, the queries
+        run in turn and tweets already yielded by an earlier query are dropped.
+        args:
+            username: Twitter username (without @)
+            keywords: list of keywords to search for
+            since_id: only return tweets newer than this id (incremental scans)
+        returns:
+            async iterator of Tweet records with matched_keywords, in the order pages arrive.
+            raises tweepy.BadRequest if a query is rejected, so the caller can fall back
+            to search_tweets_by_keyword
+        """
+        queries = plan_queries(username, keywords, self.max_query_length)
+        print(f"executing batch search with {len(keywords)} keywords in {len(queries)} query(ies)...")
+        matcher = get_matcher(keywords)
+
+        seen_ids = set()
+        for query, query_keywords in queries:
+            print(f"query ({len(query_keywords)} keywords): {query}")
+            try:
+                async for page in self._iter_query_pages(query, since_id):
+                    for tweet in page:
+                        if int(tweet.id) in seen_ids:
+                            continue
+                        seen_ids.add(int(tweet.id))
+                        # determine which keywords matched this tweet (whole words, case-insensitive)
+                        yield Tweet.from_api(tweet, matcher.find(tweet.text))
+            except tweepy.BadRequest as e:
+                # query might be too long, fall back to individual searches
+                print(f"batch query failed (possibly too long): {e}")
+                raise  # re-raise to signal fallback needed
+
+    async def _iter_query_pages(self, query: str, since_id: int = None) -> AsyncIterator[List]:
+        """
+        run one paginated search query.
+        the next page is only requested once the caller has consumed the current one.
+        args:
+            query: full search query
+            since_id: only return tweets newer than this id
+        returns:
+            async iterator of pages of tweepy Tweets; tweepy.BadRequest on the first page is re-raised
+        """
+        next_token = None
+        first_page = True
+        while first_page or next_token:
+            try:
+                response = await self.client.search_recent_tweets(
+                    query=query,
+                    max_results=100,
+                    tweet_fields=['created_at', 'public_metrics', 'text'],
+                    expansions=['author_id'],
+                    since_id=since_id,
+                    next_token=next_token
+                )
+            except tweepy.TooManyRequests:
+                if first_page:
+                    print(f"rate limit exceeded.")
+                    return
+                # the client already waited out the window and retried; stop instead of looping
+                print(f"rate limit still exceeded after {MAX_RATE_LIMIT_RETRIES} retries, stopping query.")
+                return
+            except tweepy.BadRequest as e:
+                if first_page:
+                    raise  # the query itself was rejected; let the caller decide
+                print(f"error during pagination: {e}")
+                return
+            except tweepy.NotFound:
+                print(f"no tweets found for query: {query}")
+                return
+            except Exception as e:
+                print(f"error searching tweets: {e}")
+                return
+
+            first_page = False
+            if response.data:
+                yield response.data
+            next_token = response.meta.get('next_token') if response.meta else None
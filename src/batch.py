@@ -0,0 +1,181 @@
+"""
+openai batch api mode for large offline scans.
+writes the analyzer's per-tweet requests to a jsonl batch file, submits it,
+polls until the batch finishes and maps the results back by custom_id.
+batches complete within 24 hours at a lower price and do not count against
+the interactive rate limits.
+"""
+
+import json
+import os
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pool import AnalysisPool
+from records import Tweet
+
+# the batch api accepts at most this many requests per input file
+MAX_REQUESTS_PER_BATCH = 50000
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+BATCH_ENDPOINT = '/v1/chat/completions'
+
+
+class BatchAnalysisRunner:
+    def __init__(self, analyzer, poll_interval: float = 30.0, completion_window: str = '24h',
+                 workdir: str = None, max_requests: int = MAX_REQUESTS_PER_BATCH):
+        """
+        args:
+            analyzer: ControversyAnalyzer providing the client, request bodies and response parsing
+            poll_interval: seconds between batch status checks
+            completion_window: batch completion window requested from the api
+            workdir: directory for the jsonl input files (default: system temp dir)
+            max_requests: requests per submitted batch; larger runs are split into several
+        """
+        self.analyzer = analyzer
+        self.client = analyzer.client
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.workdir = workdir
+        self.max_requests = max(1, min(max_requests, MAX_REQUESTS_PER_BATCH))
+
+    def write_input_file(self, requests: List[Tuple[str, str]]) -> str:
+        """
+        write one batch input line per (custom_id, tweet text).
+        returns:
+            path of the jsonl file
+        """
+        fd, path = tempfile.mkstemp(prefix='cleanmyx-batch-', suffix='.jsonl', dir=self.workdir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for custom_id, text in requests:
+                f.write(json.dumps({
+                    'custom_id': custom_id,
+                    'method': 'POST',
+                    'url': BATCH_ENDPOINT,
+                    'body': self.analyzer.build_request(text)
+                }, ensure_ascii=False) + '\n')
+        return path
+
+    def submit(self, path: str) -> str:
+        """upload an input file and create the batch. returns the batch id."""
+        with open(path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window
+        )
+        print(f"submitted batch {batch.id} ({path})")
+        return batch.id
+
+    def wait(self, batch_id: str):
+        """poll a batch until it reaches a terminal status and return it."""
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            counts = getattr(batch, 'request_counts', None)
+            progress = f" ({counts.completed}/{counts.total} done)" if counts else ""
+            print(f"batch {batch_id}: {batch.status}{progress}")
+            if batch.status in TERMINAL_STATUSES:
+                return batch
+            time.sleep(self.poll_interval)
+
+    def read_results(self, batch) -> Dict[str, Dict]:
+        """
+        download a finished batch's output and parse each line into an analysis.
+        returns:
+            {custom_id: analysis} for every request that produced a parseable response
+        """
+        results = {}
+        if not getattr(batch, 'output_file_id', None):
+            return results
+        content = self.client.files.content(batch.output_file_id).text
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get('response') or {}
+            if record.get('error') or response.get('status_code') != 200:
+                continue
+            try:
+                self.analyzer.record_usage(response['body'].get('usage'))
+                message = response['body']['choices'][0]['message']['content']
+                results[record['custom_id']] = self.analyzer.parse_content(message)
+            except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+                continue
+        return results
+
+    def run(self, requests: List[Tuple[str, str]]) -> Dict[str, Dict]:
+        """
+        analyze (custom_id, text) pairs through the batch api.
+        returns:
+            {custom_id: analysis}; ids missing from the result failed in the batch
+        """
+        results = {}
+        for start in range(0, len(requests), self.max_requests):
+            chunk = requests[start:start + self.max_requests]
+            path = self.write_input_file(chunk)
+            try:
+                batch = self.wait(self.submit(path))
+            finally:
+                os.remove(path)
+            if batch.status != 'completed':
+                print(f"batch {batch.id} ended with status '{batch.status}'")
+            results.update(self.read_results(batch))
+        return results
+
+
+class BatchAnalysisPool(AnalysisPool):
+    """
+    drop-in replacement for AnalysisPool that sends every llm-bound tweet through
+    the batch api in one submission instead of interactive requests.
+    """
+
+    def __init__(self, analyzer, runner: BatchAnalysisRunner, workers: int = 4, prefilter=None):
+        """
+        args:
+            analyzer: ControversyAnalyzer instance
+            runner: BatchAnalysisRunner submitting the batches
+            workers: threads retrying the requests a batch did not answer, as interactive requests
+            prefilter: optional PreFilter; tweets it skips are labelled without an llm call
+        """
+        super().__init__(analyzer, workers=workers, prefilter=prefilter)
+        self.runner = runner
+
+    def imap(self, tweets: Iterable[Tweet],
+             text_of: Callable[[Tweet], str] = lambda tweet: tweet.text,
+             preset_of: Callable[[Tweet], Optional[Dict]] = None) -> Iterator[Tuple[Tweet, Dict]]:
+        """
+        collect all tweets, analyze the ones that need the llm in a batch, and yield
+        (tweet, analysis) pairs in input order. cached analyses are reused, and
+        requests that failed inside the batch (or all of them, if the batch failed or
+        expired) are retried interactively on the regular worker pool. analyses returned by
+        preset_of (e.g. from a resumed run's journal) are used as they are.
+        """
+        tweets = list(tweets)
+        analyses = [None] * len(tweets)
+        requests = []
+        for idx, tweet in enumerate(tweets):
+            text = text_of(tweet)
+            known = preset_of(tweet) if preset_of is not None else None
+            analyses[idx] = known or self._preset(text) or self.analyzer.lookup_cached(text)
+            if analyses[idx] is None:
+                requests.append((str(idx), text))
+
+        if requests:
+            print(f"submitting {len(requests)} tweet(s) to the batch api...")
+            results = self.runner.run(requests)
+            retry = []
+            for custom_id, text in requests:
+                idx = int(custom_id)
+                if custom_id in results:
+                    analyses[idx] = results[custom_id]
+                    self.analyzer.remember(text, analyses[idx])
+                else:
+                    retry.append((idx, text))
+            if retry:
+                print(f"retrying {len(retry)} tweet(s) the batch did not answer with interactive requests...")
+                # concurrent and throttled like any interactive run
+                for (idx, _), analysis in super().imap(retry, text_of=lambda entry: entry[1]):
+                    analyses[idx] = analysis
+
+        yield from zip(tweets, analyses)
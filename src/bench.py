@@ -0,0 +1,844 @@
+#!/usr/bin/env python3
+"""
+offline benchmark for analyze_profile.
+replaces the x api with a fake http session behind the real tweepy client and
+the openai client with a local stub, both with configurable latency, page size,
+429 injection and malformed-json injection, then scans synthetic profiles and
+reports wall time, peak rss and api call counts. no credentials or network needed.
+--check-imports instead times `import main` with python -X importtime and fails
+if it loads an api sdk or exceeds its budget, and --check-prefilter runs the
+pre-filter over labelled tweets and fails if it would skip a controversial one.
+--check-async runs the async searcher against the same fake x api through an
+aiohttp-style session (skipped if tweepy's async extras are not installed).
+
+usage: python src/bench.py [--sizes 100 10000 100000] [--json results.json]
+       python src/bench.py --check-imports [--import-budget-ms 100]
+       python src/bench.py --check-prefilter
+       python src/bench.py --check-async
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+import openai
+import requests
+import tweepy
+
+from analyzer import TwitterSearcher
+from batch import MAX_REQUESTS_PER_BATCH, BatchAnalysisPool, BatchAnalysisRunner
+from extractor import ControversyAnalyzer
+from keywords import CONTROVERSIAL_KEYWORDS
+from main import analyze_profile, save_json_report
+from matcher import get_matcher
+from metrics import METRICS
+from pool import AnalysisPool
+from prefilter import PreFilter
+from ratelimit import RateLimiter
+from throttle import AdaptiveThrottle
+
+DEFAULT_SIZES = [100, 10000, 100000]
+# `import main` must stay cheap: the sdks are only imported once a scan starts
+# (newer openai releases are built on httpx2; check_import_budget also adds whichever one is installed)
+HEAVY_MODULES = ('tweepy', 'openai', 'requests', 'httpx', 'httpx2', 'dotenv')
+DEFAULT_IMPORT_BUDGET_MS = 100.0
+IMPORT_TIME_RUNS = 3
+# --check-batch scans this many llm-bound tweets with a lowered per-batch limit, so the split is exercised
+CHECK_BATCH_TWEETS = 250
+CHECK_BATCH_REQUEST_LIMIT = 100
+# --check-async scans a profile of this size in pages of this many tweets
+CHECK_ASYNC_TWEETS = 400
+CHECK_ASYNC_PAGE_SIZE = 20
+# a rate-limited search that has not stopped by then is looping
+CHECK_ASYNC_TIMEOUT_SECONDS = 10
+
+# (tweet, should the pre-filter skip it): it may only drop real false positives of the keyword search
+PREFILTER_CASES = [
+    ("our class trip was great", True),
+    ("minor league baseball tonight", True),
+    ("just a minor update to the app", True),
+    ("graduated magna cum laude!", True),
+    ("new garden hoe for the allotment", True),
+    ("urine test tomorrow morning", True),
+    ("std testing is free at the clinic this week", True),
+    ("I hate gay people", False),
+    ("gay marriage should be banned, disgusting", False),
+    ("sex education is grooming kids", False),
+    ("he was dating a minor", False),
+    ("minor league players are trash", False),
+    ("what a stupid hoe", False),
+    ("lesbian couples should not adopt", False),
+    ("abortion is murder", False),
+]
+BENCH_USERNAME = 'benchuser'
+FIRST_TWEET_ID = 1900000000000000000
+
+BENIGN_TEXTS = [
+    "great game last night, what a finish",
+    "coffee first, then emails",
+    "shipping a new release today",
+    "anyone else watching the eclipse?",
+    "minor league baseball is underrated",
+    "thanks everyone for the birthday wishes",
+]
+HOT_TEMPLATES = [
+    "i hate how people talk about {keyword}, it is disgusting",
+    "the {keyword} debate again?? these idiots never stop!!",
+    "just read an article about {keyword} policy",
+    "{keyword} jokes are not funny, shut it down",
+    "WHY IS EVERYONE TALKING ABOUT {keyword} TODAY",
+]
+
+
+class VirtualClock:
+    """unix-time clock whose sleeps advance simulated time instead of blocking."""
+
+    def __init__(self, start: float = 1700000000.0):
+        self._now = start
+        self._lock = threading.Lock()
+        self.slept = 0.0
+
+    def time(self) -> float:
+        with self._lock:
+            return self._now
+
+    def sleep(self, seconds: float):
+        with self._lock:
+            self._now += max(0.0, seconds)
+            self.slept += max(0.0, seconds)
+
+
+def synthetic_profile(size: int, keyword_rate: float = 0.3, seed: int = 0) -> List[Dict]:
+    """
+    build a deterministic timeline of size tweets, newest first.
+    args:
+        size: number of tweets
+        keyword_rate: share of tweets that contain a controversial keyword
+        seed: random seed
+    returns:
+        list of {'id', 'text', 'like_count'} dictionaries
+    """
+    rng = random.Random(seed)
+    tweets = []
+    for offset in range(size):
+        if rng.random() < keyword_rate:
+            text = rng.choice(HOT_TEMPLATES).format(keyword=rng.choice(CONTROVERSIAL_KEYWORDS))
+        else:
+            text = rng.choice(BENIGN_TEXTS)
+        tweets.append({'id': FIRST_TWEET_ID + size - offset, 'text': f"{text} #{offset}",
+                       'like_count': rng.randint(0, 500)})
+    return tweets
+
+
+class FakeXSession:
+    """
+    stands in for the requests.Session used by tweepy.Client. serves user lookups and
+    paginated search results for one synthetic profile, with x-rate-limit-* headers
+    driven by a virtual clock.
+    """
+
+    def __init__(self, username: str, tweets: List[Dict], clock: VirtualClock, latency: float = 0.0,
+                 page_size: int = 100, rate_limit_rate: float = 0.0, window_requests: int = 450,
+                 window_seconds: int = 900, reject_or_queries: bool = False, seed: int = 0):
+        self.username = username
+        self.tweets = tweets
+        self.clock = clock
+        self.latency = latency
+        self.page_size = page_size
+        self.rate_limit_rate = rate_limit_rate
+        self.window_requests = window_requests
+        self.window_seconds = window_seconds
+        self.reject_or_queries = reject_or_queries
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._windows = {}  # path -> [remaining, reset]
+        self._query_results = {}
+        self.calls: Dict[str, int] = {}
+        self.injected_429 = 0
+
+    def _rate_headers(self, path: str, exhausted: bool = False) -> Dict[str, str]:
+        now = self.clock.time()
+        window = self._windows.get(path)
+        if window is None or now >= window[1]:
+            window = self._windows[path] = [self.window_requests, int(now) + self.window_seconds]
+        if exhausted:
+            window[0] = 0
+        else:
+            window[0] = max(0, window[0] - 1)
+        return {'x-rate-limit-limit': str(self.window_requests),
+                'x-rate-limit-remaining': str(window[0]),
+                'x-rate-limit-reset': str(window[1])}
+
+    def _search(self, query: str) -> List[Dict]:
+        # same keyword semantics as the searcher's matcher: whole words, case-insensitive
+        results = self._query_results.get(query)
+        if results is None:
+            group = re.search(r'\((.*)\)\s*$', query)
+            terms = group.group(1).split(' OR ') if group else query.split()[1:]
+            matcher = get_matcher([term.strip('"') for term in terms])
+            results = self._query_results[query] = [tweet for tweet in self.tweets if matcher.find(tweet['text'])]
+        return results
+
+    def request(self, method, url, params=None, json=None, headers=None, auth=None):
+        path = url.split('api.twitter.com', 1)[-1]
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+            window = self._windows.get(path)
+            if window is not None and window[0] == 0 and self.clock.time() < window[1]:
+                return _response(429, {'title': 'Too Many Requests'}, self._rate_headers(path, exhausted=True))
+            if self._rng.random() < self.rate_limit_rate:
+                self.injected_429 += 1
+                return _response(429, {'title': 'Too Many Requests'}, self._rate_headers(path, exhausted=True))
+            rate_headers = self._rate_headers(path)
+
+        if path.startswith('/2/users/by/username/'):
+            return _response(200, {'data': {'id': '1', 'name': self.username,
+                                            'username': path.rsplit('/', 1)[-1]}}, rate_headers)
+        if path == '/2/users/by':
+            names = (params or {}).get('usernames', '').split(',')
+            return _response(200, {'data': [{'id': str(idx), 'name': name, 'username': name}
+                                            for idx, name in enumerate(names, 1)]}, rate_headers)
+        if path == '/2/tweets/search/recent':
+            if self.reject_or_queries and ' OR ' in (params or {}).get('query', ''):
+                return _response(400, {'title': 'Invalid Request', 'detail': 'query too long'}, rate_headers)
+            return _response(200, self._search_page(params or {}), rate_headers)
+        if re.fullmatch(r'/2/users/\d+/tweets', path):
+            return _response(200, self._timeline_page(params or {}), rate_headers)
+        return _response(404, {'title': 'Not Found'}, rate_headers)
+
+    def _search_page(self, params: Dict) -> Dict:
+        return self._page(self._search(params['query']), params, params.get('next_token'))
+
+    def _timeline_page(self, params: Dict) -> Dict:
+        # the whole synthetic profile, newest first (the real endpoint stops at 3200 tweets)
+        return self._page(self.tweets, params, params.get('pagination_token'))
+
+    def _page(self, results: List[Dict], params: Dict, token) -> Dict:
+        since_id = int(params['since_id']) if params.get('since_id') else None
+        if since_id is not None:
+            results = [tweet for tweet in results if tweet['id'] > since_id]
+        start = int(token or 0)
+        page = results[start:start + self.page_size]
+        meta = {'result_count': len(page)}
+        if start + self.page_size < len(results):
+            meta['next_token'] = str(start + self.page_size)
+        data = [{'id': str(tweet['id']), 'text': tweet['text'], 'author_id': '1',
+                 'edit_history_tweet_ids': [str(tweet['id'])],
+                 'created_at': '2026-01-01T00:00:00.000Z',
+                 'public_metrics': {'like_count': tweet['like_count'], 'retweet_count': 0,
+                                    'reply_count': 0, 'quote_count': 0}} for tweet in page]
+        return {'data': data, 'meta': meta} if data else {'meta': meta}
+
+
+def _response(status: int, body: Dict, headers: Dict[str, str]) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.reason = 'OK' if status == 200 else 'Error'
+    response.headers.update(headers)
+    response._content = json.dumps(body).encode('utf-8')
+    return response
+
+
+class FakeAsyncXSession:
+    """
+    stands in for the aiohttp.ClientSession used by tweepy's AsyncClient: serves the
+    requests of a FakeXSession as aiohttp-style responses, yielding to the event loop
+    once per request like a real network call.
+    """
+
+    def __init__(self, session: FakeXSession):
+        self.session = session
+
+    def request(self, method, url, params=None, json=None, headers=None):
+        return _FakeAsyncResponse(self.session.request(method, str(url), params=params, json=json, headers=headers))
+
+    async def close(self):
+        pass
+
+
+class _FakeAsyncResponse:
+    # the parts of aiohttp.ClientResponse tweepy reads, usable as `async with session.request(...)`
+    def __init__(self, response: requests.Response):
+        self._response = response
+        self.status = response.status_code
+        self.reason = response.reason
+        self.headers = response.headers
+
+    async def __aenter__(self) -> '_FakeAsyncResponse':
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def read(self) -> bytes:
+        return self._response.content
+
+    async def json(self):
+        return self._response.json()
+
+
+class FakeOpenAI:
+    """
+    stands in for openai.OpenAI: answers chat completions (single and batched prompts)
+    with schema-valid json, optionally slowed down, rate limited or malformed. also
+    serves the batch api (files.create / content, batches.create / retrieve): every
+    batch finishes on its second status check, with its output lines shuffled and
+    optionally some of them failed, or the whole batch ended as failed or expired.
+    """
+
+    def __init__(self, latency: float = 0.0, rate_limit_rate: float = 0.0, malformed_rate: float = 0.0,
+                 retry_after_ms: int = 10, batch_line_failure_rate: float = 0.0,
+                 batch_status: str = 'completed', seed: int = 0):
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.retry_after_ms = retry_after_ms
+        self.batch_line_failure_rate = batch_line_failure_rate
+        self.batch_status = batch_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.injected_429 = 0
+        self.injected_malformed = 0
+        # threads that issued interactive requests
+        self.caller_threads = set()
+        completions = SimpleNamespace(create=self.create)
+        completions.with_raw_response = SimpleNamespace(create=self._create_raw)
+        self.chat = SimpleNamespace(completions=completions)
+
+        self._files: Dict[str, str] = {}
+        self._batches: Dict[str, SimpleNamespace] = {}
+        self.batch_sizes: List[int] = []
+        self.batch_failed_lines = 0
+        self.files = SimpleNamespace(create=self._file_create, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._batch_create, retrieve=self._batch_retrieve)
+
+    def _file_create(self, file, purpose: str):
+        file_id = f"file-{len(self._files) + 1}"
+        self._files[file_id] = file.read().decode('utf-8')
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def _file_content(self, file_id: str):
+        return SimpleNamespace(text=self._files[file_id])
+
+    def _batch_create(self, input_file_id: str, endpoint: str, completion_window: str):
+        lines = []
+        for line in self._files[input_file_id].splitlines():
+            request = json.loads(line)
+            if self._rng.random() < self.batch_line_failure_rate:
+                self.batch_failed_lines += 1
+                lines.append({'custom_id': request['custom_id'], 'response': None,
+                              'error': {'code': 'server_error', 'message': 'failure injected by benchmark'}})
+                continue
+            content, usage = self._completion(request['body']['messages'], request['body'].get('response_format'))
+            lines.append({'custom_id': request['custom_id'], 'error': None,
+                          'response': {'status_code': 200, 'body': {
+                              'choices': [{'message': {'content': content}}], 'usage': usage}}})
+        # output order is not input order, so results must be matched by custom_id
+        self._rng.shuffle(lines)
+        self.batch_sizes.append(len(lines))
+
+        batch_id = f"batch-{len(self._batches) + 1}"
+        output_file_id = None
+        if self.batch_status == 'completed':
+            output_file_id = f"file-{len(self._files) + 1}"
+            self._files[output_file_id] = ''.join(json.dumps(line) + '\n' for line in lines)
+        self._batches[batch_id] = SimpleNamespace(
+            id=batch_id, status='validating', final_status=self.batch_status, output_file_id=None,
+            pending_output_file_id=output_file_id,
+            request_counts=SimpleNamespace(completed=0, total=len(lines)))
+        return self._batches[batch_id]
+
+    def _batch_retrieve(self, batch_id: str):
+        batch = self._batches[batch_id]
+        if batch.status == 'validating':
+            batch.status = 'in_progress'
+        else:
+            batch.status = batch.final_status
+            batch.output_file_id = batch.pending_output_file_id
+            if batch.status == 'completed':
+                batch.request_counts.completed = batch.request_counts.total
+        return batch
+
+    def _create_raw(self, **kwargs):
+        response = self.create(**kwargs)
+        return SimpleNamespace(headers={'x-ratelimit-remaining-requests': '10000',
+                                        'x-ratelimit-limit-requests': '10000'},
+                               parse=lambda: response)
+
+    def create(self, model, messages, response_format=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            self.caller_threads.add(threading.get_ident())
+            rate_limited = self._rng.random() < self.rate_limit_rate
+            malformed = not rate_limited and self._rng.random() < self.malformed_rate
+            self.injected_429 += rate_limited
+            self.injected_malformed += malformed
+        if rate_limited:
+            response = SimpleNamespace(request=None, status_code=429,
+                                       headers={'retry-after-ms': str(self.retry_after_ms)})
+            raise openai.RateLimitError('rate limit injected by benchmark', response=response, body=None)
+
+        content, usage = self._completion(messages, response_format, malformed)
+        usage = SimpleNamespace(prompt_tokens_details=SimpleNamespace(**usage.pop('prompt_tokens_details')), **usage)
+        message = SimpleNamespace(content=content, refusal=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    def _completion(self, messages: List[Dict], response_format: Dict = None, malformed: bool = False):
+        """reply content and usage dict for one chat request."""
+        tweet_text = messages[-1]['content']
+        schema_name = ((response_format or {}).get('json_schema') or {}).get('name')
+        if malformed:
+            content = '{"is_controversial": "maybe", "controversy_score": '
+        elif schema_name == 'tweet_analyses':
+            entries = json.loads(tweet_text)
+            content = json.dumps({'results': [dict(_fake_analysis(entry['text']), index=entry['index'])
+                                              for entry in entries]})
+        else:
+            content = json.dumps(_fake_analysis(tweet_text))
+
+        prompt_tokens = sum(len(message['content']) for message in messages) // 4
+        completion_tokens = len(content) // 4
+        return content, {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                         'total_tokens': prompt_tokens + completion_tokens,
+                         'prompt_tokens_details': {'cached_tokens': 0}}
+
+
+def _fake_analysis(text: str) -> Dict:
+    score = len(text) % 11
+    return {'is_controversial': score >= 6, 'controversy_score': score,
+            'reasons': ['benchmark'] if score >= 6 else [], 'topics': []}
+
+
+def peak_rss_mb() -> float:
+    """peak resident set size of this process in megabytes (0 where unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def build_scan(size: int, args):
+    """
+    wire a searcher, analyzer and pool for one synthetic profile of size tweets to the fakes.
+    returns:
+        (clock, fake x session, searcher, fake openai, analyzer, pool)
+    """
+    clock = VirtualClock()
+    session = FakeXSession(BENCH_USERNAME, synthetic_profile(size, args.keyword_rate, args.seed), clock,
+                           latency=args.x_latency, page_size=args.page_size,
+                           rate_limit_rate=args.x_429_rate, reject_or_queries=args.force_fallback, seed=args.seed)
+    searcher = TwitterSearcher('bench-token', rate_limiter=RateLimiter(clock=clock.time, sleep=clock.sleep),
+                               search_workers=args.search_workers)
+    searcher.client.session = session
+
+    fake_openai = FakeOpenAI(latency=args.llm_latency, rate_limit_rate=args.llm_429_rate,
+                             malformed_rate=args.malformed_rate, batch_line_failure_rate=args.batch_failure_rate,
+                             batch_status=args.batch_status, seed=args.seed)
+    throttle = AdaptiveThrottle(initial_limit=min(4, args.workers), max_limit=args.workers)
+    analyzer = ControversyAnalyzer('bench-key', throttle=throttle)
+    analyzer.client = fake_openai
+
+    prefilter = PreFilter(CONTROVERSIAL_KEYWORDS) if args.prefilter else None
+    if args.llm_mode == 'batch':
+        runner = BatchAnalysisRunner(analyzer, poll_interval=0, max_requests=args.batch_max_requests)
+        pool = BatchAnalysisPool(analyzer, runner, workers=args.workers, prefilter=prefilter)
+    else:
+        pool = AnalysisPool(analyzer, workers=args.workers, batch_size=args.llm_batch_size, prefilter=prefilter)
+    return clock, session, searcher, fake_openai, analyzer, pool
+
+
+@contextlib.contextmanager
+def quiet():
+    """discard console output inside the block (scans print a line per tweet)."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def expect(failures: List[str], ok: bool, message: str):
+    """print and record a failed check."""
+    if not ok:
+        failures.append(message)
+        print(f"error: {message}")
+
+
+def scan_quietly(searcher, analyzer, pool, source: str = 'search') -> Dict:
+    """analyze_profile for the benchmark user with its console output discarded."""
+    with quiet():
+        return analyze_profile(BENCH_USERNAME, searcher, analyzer, pool, source=source)
+
+
+def run_profile(size: int, args) -> Dict:
+    """
+    scan one synthetic profile of size tweets against the fakes.
+    returns:
+        dictionary with wall time, peak rss, api call counts and analysis counts
+    """
+    clock, session, searcher, fake_openai, analyzer, pool = build_scan(size, args)
+
+    fd, report_path = tempfile.mkstemp(prefix='cleanmyx-bench-', suffix='.json')
+    os.close(fd)
+    start = time.perf_counter()
+    try:
+        with quiet():
+            results = analyze_profile(BENCH_USERNAME, searcher, analyzer, pool, source=args.source)
+            save_json_report(results, report_path)
+        wall = time.perf_counter() - start
+    finally:
+        os.remove(report_path)
+
+    spans = METRICS.summary()['spans']
+    return {
+        'tweets': size,
+        'matched': results['total_tweets_found'],
+        'analyzed': results['summary']['total_analyzed'],
+        'skipped_by_prefilter': results['summary']['skipped_by_prefilter'],
+        'controversial': results['summary']['controversial'],
+        'wall_seconds': round(wall, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'x_calls': sum(session.calls.values()),
+        'x_calls_by_endpoint': session.calls,
+        'x_injected_429': session.injected_429,
+        'x_simulated_wait_seconds': round(clock.slept, 1),
+        'llm_calls': fake_openai.calls,
+        'llm_injected_429': fake_openai.injected_429,
+        'llm_injected_malformed': fake_openai.injected_malformed,
+        'llm_batches': len(fake_openai.batch_sizes),
+        'llm_batch_requests': sum(fake_openai.batch_sizes),
+        'llm_responses': analyzer.stats(),
+        'llm_p50_ms': round(spans.get('llm_request', {}).get('p50_seconds', 0) * 1000, 2),
+        'llm_p99_ms': round(spans.get('llm_request', {}).get('p99_seconds', 0) * 1000, 2)
+    }
+
+
+def run_isolated(size: int, argv: List[str]) -> Dict:
+    """run one profile size in a fresh interpreter so peak rss is measured per size."""
+    # the child ignores --sizes and --json and only runs the size it is given
+    command = [sys.executable, os.path.abspath(__file__)] + argv + ['--run-size', str(size)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"benchmark for {size} tweets failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def import_times(module: str = 'main') -> Dict[str, float]:
+    """
+    import a module in a fresh interpreter under python -X importtime.
+    returns:
+        {imported module name: cumulative import time in milliseconds}
+    """
+    command = [sys.executable, '-X', 'importtime', '-c', f'import {module}']
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr}")
+    times = {}
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if not line.startswith('import time:') or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        times[parts[2].strip()] = int(parts[1]) / 1000
+    return times
+
+
+def check_import_budget(budget_ms: float) -> bool:
+    """
+    check that `import main` loads none of HEAVY_MODULES (plus the http package the installed
+    openai sdk is built on) and stays within budget_ms
+    (best of IMPORT_TIME_RUNS fresh interpreters, so one slow run does not fail it).
+    returns:
+        True if both checks pass
+    """
+    runs = [import_times('main') for _ in range(IMPORT_TIME_RUNS)]
+    best_ms = min(times['main'] for times in runs)
+    # the package openai's public Limits class comes from, whatever the sdk release builds on
+    heavy_modules = set(HEAVY_MODULES) | {type(openai.DEFAULT_CONNECTION_LIMITS).__module__.split('.')[0]}
+    heavy = sorted(name for name in runs[0] if name.split('.')[0] in heavy_modules)
+
+    ok = True
+    print(f"import main: {best_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+    if best_ms > budget_ms:
+        print("error: import time budget exceeded")
+        ok = False
+    if heavy:
+        print(f"error: import main loads {', '.join(sorted({name.split('.')[0] for name in heavy}))}; "
+              "import them where they are used")
+        ok = False
+    return ok
+
+
+def check_prefilter() -> bool:
+    """
+    run the pre-filter at its default threshold over PREFILTER_CASES.
+    returns:
+        True if every tweet gets the expected verdict
+    """
+    prefilter = PreFilter(CONTROVERSIAL_KEYWORDS)
+    failures = 0
+    for text, should_skip in PREFILTER_CASES:
+        verdict = prefilter.evaluate(text)
+        if verdict.skip != should_skip:
+            failures += 1
+            expected = 'skipped' if should_skip else 'sent to the llm'
+            print(f"error: expected {text!r} to be {expected} (score {verdict.score}, {verdict.reason or 'no skip'})")
+    print(f"pre-filter: {len(PREFILTER_CASES) - failures}/{len(PREFILTER_CASES)} labelled tweets as expected")
+    return failures == 0
+
+
+def check_batch(args) -> bool:
+    """
+    run --llm-mode batch against the batch api stand-in and check that analyses map back to
+    their tweets by custom_id, that failed lines and failed or expired batches are retried on
+    the interactive worker pool, and that runs over the per-batch request limit are split.
+    returns:
+        True if every check passes
+    """
+    failures = []
+
+    def misattributed(results: Dict) -> int:
+        # the stand-in's verdict depends only on the text, so a row mapped to another tweet's line differs
+        fields = ('is_controversial', 'controversy_score', 'reasons', 'topics')
+        return sum(1 for tweet, analysis in results['tweets']
+                   if {key: getattr(analysis, key) for key in fields} != _fake_analysis(tweet.text))
+
+    size = CHECK_BATCH_TWEETS
+    scenario = argparse.Namespace(**dict(vars(args), llm_mode='batch', keyword_rate=1.0, prefilter=False,
+                                         llm_429_rate=0.0, malformed_rate=0.0, force_fallback=False,
+                                         batch_max_requests=CHECK_BATCH_REQUEST_LIMIT))
+
+    # completed batches with some failed lines, split by the request limit
+    scenario.batch_failure_rate, scenario.batch_status = 0.05, 'completed'
+    _, _, searcher, fake, analyzer, pool = build_scan(size, scenario)
+    results = scan_quietly(searcher, analyzer, pool)
+    expected_batches = -(-size // CHECK_BATCH_REQUEST_LIMIT)
+    expect(failures, fake.batch_sizes and max(fake.batch_sizes) <= CHECK_BATCH_REQUEST_LIMIT
+           and sum(fake.batch_sizes) == size and len(fake.batch_sizes) == expected_batches,
+           f"{size} requests with a limit of {CHECK_BATCH_REQUEST_LIMIT} were submitted as {fake.batch_sizes}, "
+           f"expected {expected_batches} batches")
+    expect(failures, BatchAnalysisRunner(analyzer, max_requests=10 ** 6).max_requests == MAX_REQUESTS_PER_BATCH,
+           f"a runner allowed more than {MAX_REQUESTS_PER_BATCH} requests per batch")
+    expect(failures, fake.batch_failed_lines > 0 and fake.calls == fake.batch_failed_lines,
+           f"{fake.batch_failed_lines} failed batch line(s) led to {fake.calls} interactive retries")
+    expect(failures, results['summary']['total_analyzed'] == size and misattributed(results) == 0,
+           f"{misattributed(results)} of {results['summary']['total_analyzed']} analyses do not belong to their tweet")
+
+    # a batch that expires is retried in full, concurrently on the worker pool
+    scenario.batch_failure_rate, scenario.batch_status = 0.0, 'expired'
+    _, _, searcher, fake, analyzer, pool = build_scan(size, scenario)
+    results = scan_quietly(searcher, analyzer, pool)
+    expect(failures, fake.calls == size, f"an expired batch of {size} requests led to {fake.calls} interactive retries")
+    expect(failures, scenario.workers == 1 or len(fake.caller_threads) > 1,
+           f"retries of an expired batch ran on {len(fake.caller_threads)} thread(s), not the worker pool")
+    expect(failures, misattributed(results) == 0,
+           f"{misattributed(results)} retried analyses do not belong to their tweet")
+
+    print(f"batch mode: {'ok' if not failures else f'{len(failures)} check(s) failed'} "
+          f"({size} tweets, batches of at most {CHECK_BATCH_REQUEST_LIMIT})")
+    return not failures
+
+
+def check_async(args) -> bool:
+    """
+    run AsyncTwitterSearcher against the fake x api behind an aiohttp-style session and check
+    that it finds the same tweets and keywords as the sync searcher, that per-keyword searches
+    still work when the OR-query is rejected, and that pagination stops once 429s outlast the
+    client's retries. needs tweepy's async extras; without them the check is skipped.
+    returns:
+        True if every check passes or the check was skipped
+    """
+    from async_analyzer import AsyncTwitterSearcher
+    try:
+        AsyncTwitterSearcher('bench-token')
+    except ImportError as e:
+        print(f"async searcher: skipped ({e})")
+        return True
+
+    failures = []
+
+    tweets = synthetic_profile(CHECK_ASYNC_TWEETS, args.keyword_rate, args.seed)
+
+    def fake_session(**kwargs) -> FakeXSession:
+        return FakeXSession(BENCH_USERNAME, tweets, VirtualClock(), page_size=CHECK_ASYNC_PAGE_SIZE,
+                            seed=args.seed, **kwargs)
+
+    def async_searcher(session: FakeXSession):
+        searcher = AsyncTwitterSearcher('bench-token', rate_limiter=RateLimiter(clock=session.clock.time))
+        searcher.client.session = FakeAsyncXSession(session)
+        return searcher
+
+    session = fake_session()
+    sync_searcher = TwitterSearcher('bench-token', rate_limiter=RateLimiter(clock=session.clock.time,
+                                                                            sleep=session.clock.sleep))
+    sync_searcher.client.session = session
+    with quiet():
+        expected = {tweet.id: tweet.matched_keywords
+                    for page in sync_searcher.iter_tweet_pages(BENCH_USERNAME, CONTROVERSIAL_KEYWORDS)
+                    for tweet in page}
+
+    async def batch_search():
+        async with async_searcher(fake_session()) as searcher:
+            exists = await searcher.validate_user(BENCH_USERNAME)
+            found = {tweet.id: tweet.matched_keywords async for tweet in
+                     searcher.search_tweets_by_keywords_batch(BENCH_USERNAME, CONTROVERSIAL_KEYWORDS)}
+            return exists, found
+
+    async def keyword_searches():
+        async with async_searcher(fake_session(reject_or_queries=True)) as searcher:
+            try:
+                async for _ in searcher.search_tweets_by_keywords_batch(BENCH_USERNAME, CONTROVERSIAL_KEYWORDS):
+                    pass
+            except tweepy.BadRequest:
+                rejected = True
+            else:
+                rejected = False
+
+            async def search(keyword: str) -> List[int]:
+                return [tweet.id async for tweet in searcher.search_tweets_by_keyword(BENCH_USERNAME, keyword)]
+            # every keyword in flight at once on the loop
+            found = await asyncio.gather(*(search(keyword) for keyword in CONTROVERSIAL_KEYWORDS))
+            return rejected, {tweet_id for ids in found for tweet_id in ids}
+
+    async def rate_limited_search():
+        # windows reset immediately, so the client's retries go out without waiting
+        session = fake_session(window_seconds=0)
+        async with async_searcher(session) as searcher:
+            found = []
+            async for tweet in searcher.search_tweets_by_keywords_batch(BENCH_USERNAME, CONTROVERSIAL_KEYWORDS):
+                found.append(tweet.id)
+                # every request after the first page is answered with 429
+                session.rate_limit_rate = 1.0
+            return found
+
+    with quiet():
+        exists, found = asyncio.run(batch_search())
+        rejected, keyword_found = asyncio.run(keyword_searches())
+        try:
+            limited = asyncio.run(asyncio.wait_for(rate_limited_search(), CHECK_ASYNC_TIMEOUT_SECONDS))
+        except asyncio.TimeoutError:
+            limited = None
+
+    expect(failures, exists, f"validate_user did not find @{BENCH_USERNAME}")
+    expect(failures, found == expected,
+           f"the async batch search returned {len(found)} tweet(s), the sync search {len(expected)}, "
+           f"{sum(1 for tweet_id in found if found[tweet_id] != expected.get(tweet_id))} with other keywords")
+    expect(failures, rejected, "a rejected OR-query did not raise BadRequest for the caller's fallback")
+    expect(failures, keyword_found == set(expected),
+           f"the per-keyword searches returned {len(keyword_found)} tweet(s), expected {len(expected)}")
+    expect(failures, limited is not None and 0 < len(limited) < len(expected),
+           "pagination did not stop when every retry was rate limited" if limited is None else
+           f"a search rate limited after its first page returned {len(limited)} of {len(expected)} tweet(s)")
+
+    print(f"async searcher: {'ok' if not failures else f'{len(failures)} check(s) failed'} "
+          f"({len(expected)} tweets, {len(CONTROVERSIAL_KEYWORDS)} concurrent keyword searches)")
+    return not failures
+
+
+def print_table(rows: List[Dict]):
+    """print one line per profile size."""
+    header = (f"{'tweets':>8} {'matched':>8} {'llm-bound':>9} {'wall s':>8} {'rss MB':>8} "
+              f"{'x calls':>8} {'x 429':>6} {'llm calls':>9} {'llm 429':>7} {'bad json':>8} {'p99 ms':>7}")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['tweets']:>8} {row['matched']:>8} {row['analyzed'] - row['skipped_by_prefilter']:>9} "
+              f"{row['wall_seconds']:>8.2f} {row['peak_rss_mb']:>8.1f} {row['x_calls']:>8} "
+              f"{row['x_injected_429']:>6} {row['llm_calls']:>9} {row['llm_injected_429']:>7} "
+              f"{row['llm_injected_malformed']:>8} {row['llm_p99_ms']:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="offline throughput benchmark for analyze_profile")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='synthetic profile sizes in tweets (default: 100 10000 100000)')
+    parser.add_argument('--keyword-rate', type=float, default=0.3,
+                        help='share of synthetic tweets containing a keyword (default: 0.3)')
+    parser.add_argument('--source', choices=['search', 'timeline'], default='search',
+                        help='where analyze_profile reads tweets from (default: search)')
+    parser.add_argument('--force-fallback', action='store_true',
+                        help='reject OR-queries with 400 so the per-keyword fallback runs')
+    parser.add_argument('--search-workers', type=int, default=4,
+                        help='concurrent per-keyword fallback searches (default: 4)')
+    parser.add_argument('--page-size', type=int, default=100, help='tweets per search page (default: 100)')
+    parser.add_argument('--x-latency', type=float, default=0.01,
+                        help='seconds added to every x api request (default: 0.01)')
+    parser.add_argument('--x-429-rate', type=float, default=0.0,
+                        help='probability an x api request is answered with 429 (default: 0)')
+    parser.add_argument('--llm-latency', type=float, default=0.005,
+                        help='seconds added to every llm request (default: 0.005)')
+    parser.add_argument('--llm-429-rate', type=float, default=0.0,
+                        help='probability an llm request is answered with 429 (default: 0)')
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help='probability an llm reply is malformed json (default: 0)')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='llm analysis workers (default: 4)')
+    parser.add_argument('--llm-batch-size', type=int, default=1, help='tweets per llm prompt (default: 1)')
+    parser.add_argument('--llm-mode', choices=['interactive', 'batch'], default='interactive',
+                        help='interactive requests, or the batch api stand-in (default: interactive)')
+    parser.add_argument('--batch-failure-rate', type=float, default=0.0,
+                        help='probability a batch output line is an error (default: 0)')
+    parser.add_argument('--batch-status', choices=['completed', 'failed', 'expired'], default='completed',
+                        help='status every batch ends with (default: completed)')
+    parser.add_argument('--batch-max-requests', type=int, default=MAX_REQUESTS_PER_BATCH,
+                        help=f'requests per submitted batch (default: {MAX_REQUESTS_PER_BATCH})')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='skip tweets the local pre-filter scores as harmless (default: every tweet goes to the llm)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for profiles and injection')
+    parser.add_argument('--json', metavar='PATH', help='also write the results to this json file')
+    parser.add_argument('--check-batch', action='store_true',
+                        help='only check --llm-mode batch against the batch api stand-in')
+    parser.add_argument('--check-async', action='store_true',
+                        help='only check AsyncTwitterSearcher against the fake x api (needs tweepy[async])')
+    parser.add_argument('--check-prefilter', action='store_true',
+                        help='only check the pre-filter against labelled tweets')
+    parser.add_argument('--check-imports', action='store_true',
+                        help='only check the import time of main.py against --import-budget-ms')
+    parser.add_argument('--import-budget-ms', type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+                        help=f'import time budget for main.py in ms (default: {DEFAULT_IMPORT_BUDGET_MS:.0f})')
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)
+
+    argv = sys.argv[1:]
+    args = parser.parse_args(argv)
+    if args.check_imports:
+        sys.exit(0 if check_import_budget(args.import_budget_ms) else 1)
+    if args.check_prefilter:
+        sys.exit(0 if check_prefilter() else 1)
+    if args.check_batch:
+        sys.exit(0 if check_batch(args) else 1)
+    if args.check_async:
+        sys.exit(0 if check_async(args) else 1)
+    if args.run_size is not None:
+        print(json.dumps(run_profile(args.run_size, args)))
+        return
+
+    rows = []
+    for size in args.sizes:
+        print(f"benchmarking {size} tweets...", flush=True)
+        rows.append(run_isolated(size, argv))
+    print()
+    print_table(rows)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nresults saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+persistent content-addressed cache for llm tweet analyses.
+entries are keyed by a hash of the normalized tweet text, the model and the
+prompt version, stored in sqlite so separate runs (and separate processes)
+can share them.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional
+
+# retweets carry the original text behind an "RT @user: " prefix
+RETWEET_PREFIX = re.compile(r'^RT @\w+:\s*')
+WHITESPACE = re.compile(r'\s+')
+
+# how many writes between eviction passes
+EVICTION_INTERVAL = 100
+
+
+def normalize_text(text: str) -> str:
+    """normalize tweet text so retweets and copy-pasted duplicates share a cache key."""
+    text = unicodedata.normalize('NFKC', text)
+    text = RETWEET_PREFIX.sub('', text)
+    return WHITESPACE.sub(' ', text).strip()
+
+
+class AnalysisCache:
+    def __init__(self, path: str, ttl_seconds: float = 30 * 24 * 3600, max_entries: int = 100000):
+        """
+        args:
+            path: sqlite database file (created if missing)
+            ttl_seconds: entries older than this are treated as misses and purged
+            max_entries: size bound; least recently used entries are evicted past it
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS analyses ('
+            ' key TEXT PRIMARY KEY,'
+            ' analysis TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS analyses_last_access ON analyses (last_access)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """one connection per thread; wal mode lets concurrent writers share the file."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(text: str, model: str, prompt_version: str) -> str:
+        """
+        build the cache key for a tweet analysis.
+        args:
+            text: tweet text
+            model: llm model name
+            prompt_version: version tag of the prompt that produced the analysis
+        returns:
+            hex sha-256 digest
+        """
+        payload = '\x1f'.join([prompt_version, model, normalize_text(text)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """return the cached analysis for key, or None on a miss or expired entry."""
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute('SELECT analysis, created_at FROM analyses WHERE key = ?', (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            if row is not None:
+                conn.execute('DELETE FROM analyses WHERE key = ?', (key,))
+            with self._lock:
+                self.misses += 1
+            return None
+
+        conn.execute('UPDATE analyses SET last_access = ? WHERE key = ?', (now, key))
+        with self._lock:
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, analysis: Dict):
+        """store an analysis, evicting expired and least recently used entries periodically."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO analyses (key, analysis, created_at, last_access) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(analysis, ensure_ascii=False), now, now)
+        )
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICTION_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """purge expired entries and trim the table to max_entries by last access time."""
+        conn = self._connection()
+        conn.execute('DELETE FROM analyses WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+        count = conn.execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                'DELETE FROM analyses WHERE key IN '
+                '(SELECT key FROM analyses ORDER BY last_access ASC LIMIT ?)',
+                (count - self.max_entries,)
+            )
+
+    def stats(self) -> Dict:
+        """hit/miss counters for this process."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
@@ -1,13 +1,261 @@
 import openai
 import json
-import time
-from typing import Dict
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from metrics import METRICS
+from throttle import AdaptiveThrottle
+
+# bump whenever the prompts change so cached analyses from older prompts are not reused
+PROMPT_VERSION = "4"
+
+# rough characters-per-token ratio used to size batches without a tokenizer
+CHARS_PER_TOKEN = 4
+# budget reserved for each tweet's entry in a batched json response
+OUTPUT_TOKENS_PER_TWEET = 120
+
+# JSON schema enforced through response_format so replies always parse
+ANALYSIS_PROPERTIES = {
+    "is_controversial": {"type": "boolean"},
+    "controversy_score": {"type": "integer", "description": "0 (benign) to 10 (highly controversial)"},
+    "reasons": {"type": "array", "items": {"type": "string"}},
+    "topics": {"type": "array", "items": {"type": "string"}}
+}
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": ANALYSIS_PROPERTIES,
+    "required": list(ANALYSIS_PROPERTIES),
+    "additionalProperties": False
+}
+BATCH_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"index": {"type": "integer"}, **ANALYSIS_PROPERTIES},
+                "required": ["index", *ANALYSIS_PROPERTIES],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["results"],
+    "additionalProperties": False
+}
+
+REASK_PROMPT = """Your previous reply could not be used: {error}.
+Reply again with only the JSON object for the same tweet, matching the required schema."""
+
+# static instructions sent as the system message; tweet text always comes after them in
+# a separate user message, so every request shares the same cacheable prompt prefix
+CRITERIA = """Consider:
+- Polarizing political statements
+- Offensive language
+- Misinformation claims
+- Inflammatory rhetoric
+- Hot-button topics"""
+
+SYSTEM_PROMPT = f"""You analyze whether a tweet is controversial. {CRITERIA}
+
+The user message is the tweet text. Respond with valid JSON only (no markdown, no code blocks):
+{{
+    "is_controversial": true/false,
+    "controversy_score": 0-10,
+    "reasons": ["reason1", "reason2"],
+    "topics": ["politics", "religion", etc]
+}}"""
+
+BATCH_SYSTEM_PROMPT = f"""You analyze whether tweets are controversial. {CRITERIA}
+
+The user message is a JSON array of tweets, each an object {{"index": n, "text": "..."}}; a tweet's text may span several lines. Respond with a JSON object whose "results" array has one object per tweet, using the tweet's "index":
+{{
+    "results": [
+        {{
+            "index": 0,
+            "is_controversial": true/false,
+            "controversy_score": 0-10,
+            "reasons": ["reason1", "reason2"],
+            "topics": ["politics", "religion", etc]
+        }}
+    ]
+}}"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for budget planning (no tokenizer dependency)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def batch_entry(index: int, text: str) -> str:
+    """One tweet of a batched prompt: the user message is a JSON array of these objects."""
+    return json.dumps({"index": index, "text": text}, ensure_ascii=False)
+
+
+def strip_code_fences(content: str) -> str:
+    """Remove markdown code fences the model sometimes wraps around JSON."""
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:]
+    if content.startswith("```"):
+        content = content[3:]
+    if content.endswith("```"):
+        content = content[:-3]
+    return content.strip()
+
+
+def json_schema_format(name: str, schema: Dict) -> Dict:
+    """response_format asking for strict schema-constrained JSON output."""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def failed_analysis(reason: str) -> Dict:
+    """
+    Analysis returned when no valid response could be obtained. It is flagged so it
+    is never mistaken for a genuine "not controversial" verdict, and never cached.
+    """
+    return {
+        "is_controversial": False,
+        "controversy_score": 0,
+        "reasons": [reason],
+        "topics": [],
+        "analysis_failed": True
+    }
+
+
+def validate_analysis(item) -> Optional[Dict]:
+    """
+    Check that a parsed response element has the expected analysis fields.
+    
+    Returns:
+        Normalized analysis dictionary, or None if the element is malformed
+    """
+    if not isinstance(item, dict):
+        return None
+    is_controversial = item.get("is_controversial")
+    score = item.get("controversy_score")
+    reasons = item.get("reasons", [])
+    topics = item.get("topics", [])
+    if not isinstance(is_controversial, bool):
+        return None
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 10:
+        return None
+    if not isinstance(reasons, list) or not isinstance(topics, list):
+        return None
+    return {
+        "is_controversial": is_controversial,
+        "controversy_score": int(score),
+        "reasons": [str(reason) for reason in reasons],
+        "topics": [str(topic) for topic in topics]
+    }
 
 
 class ControversyAnalyzer:
-    def __init__(self, api_key, model="gpt-4o-mini"):
-        self.client = openai.OpenAI(api_key=api_key)
+    def __init__(self, api_key, model="gpt-4o-mini", max_input_tokens=6000, max_output_tokens=4000,
+                 cache=None, throttle=None, transport=None):
+        """
+        Args:
+            api_key: OpenAI API key
+            model: Chat model used for analysis
+            max_input_tokens: Estimated prompt token ceiling for one batched request
+            max_output_tokens: Completion token ceiling for one batched request
+            cache: Optional AnalysisCache consulted before calling the API
+            throttle: AdaptiveThrottle shared by all calls (retries and backoff happen there,
+                so the SDK's own retries are disabled)
+            transport: Optional shared Transport whose pooled http client the OpenAI client uses
+        """
+        http_client = transport.openai_http_client if transport is not None else None
+        self.client = openai.OpenAI(api_key=api_key, max_retries=0, http_client=http_client)
         self.model = model
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.cache = cache
+        self.throttle = throttle or AdaptiveThrottle()
+        # response quality counters, shared by all worker threads
+        self._stats_lock = threading.Lock()
+        self.response_stats = {
+            "invalid_responses": 0,
+            "reasks": 0,
+            "reask_recovered": 0,
+            "failed": 0
+        }
+        # token usage, including prompt tokens served from the provider's prefix cache
+        self.usage_stats = {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "completion_tokens": 0
+        }
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.response_stats[name] += 1
+
+    def stats(self) -> Dict:
+        """Snapshot of the response quality counters."""
+        with self._stats_lock:
+            return dict(self.response_stats)
+
+    def usage(self) -> Dict:
+        """Snapshot of the token usage counters."""
+        with self._stats_lock:
+            return dict(self.usage_stats)
+
+    def record_usage(self, usage):
+        """
+        Add one response's token usage to the counters.
+        
+        Args:
+            usage: The response's usage object, or its dict form (Batch API output lines)
+        """
+        if usage is None:
+            return
+
+        def field(obj, name):
+            value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+            return value or 0
+
+        details = field(usage, "prompt_tokens_details")
+        with self._stats_lock:
+            self.usage_stats["requests"] += 1
+            self.usage_stats["prompt_tokens"] += field(usage, "prompt_tokens")
+            self.usage_stats["cached_prompt_tokens"] += field(details, "cached_tokens") if details else 0
+            self.usage_stats["completion_tokens"] += field(usage, "completion_tokens")
+
+    def _create(self, **kwargs):
+        """Issue one chat completion through the throttle and report its rate-limit headers."""
+        def request():
+            raw = self.client.chat.completions.with_raw_response.create(**kwargs)
+            return raw.headers, raw.parse()
+
+        with METRICS.span("llm_request"):
+            headers, response = self.throttle.call(request)
+        usage = getattr(response, "usage", None)
+        self.throttle.observe(headers, tokens=getattr(usage, "total_tokens", 0) or 0)
+        self.record_usage(usage)
+        return response
+
+    def _cache_key(self, tweet_text: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self.cache.make_key(tweet_text, self.model, PROMPT_VERSION)
+
+    def _cached(self, key: Optional[str]) -> Optional[Dict]:
+        if key is None:
+            return None
+        return self.cache.get(key)
+
+    def _store(self, key: Optional[str], analysis: Dict):
+        if key is not None:
+            self.cache.put(key, analysis)
+
+    def lookup_cached(self, tweet_text: str) -> Optional[Dict]:
+        """Return the cached analysis for a tweet, or None (also when caching is disabled)."""
+        return self._cached(self._cache_key(tweet_text))
+
+    def remember(self, tweet_text: str, analysis: Dict):
+        """Cache an analysis produced outside analyze_controversy (e.g. by the Batch API)."""
+        self._store(self._cache_key(tweet_text), analysis)
 
     def analyze_controversy(self, tweet_text: str) -> Dict:
         """
@@ -23,73 +271,201 @@ class ControversyAnalyzer:
             - reasons: list of strings
             - topics: list of strings
         """
-        prompt = f"""Analyze if this tweet is controversial. Consider:
-- Polarizing political statements
-- Offensive language
-- Misinformation claims
-- Inflammatory rhetoric
-- Hot-button topics
+        with METRICS.span("analyze_controversy"):
+            key = self._cache_key(tweet_text)
+            cached = self._cached(key)
+            if cached is not None:
+                return cached
 
-Tweet: {tweet_text}
+            analysis, succeeded = self._analyze_uncached(tweet_text)
+            # only successful analyses are cached; error defaults should be retried next run
+            if succeeded:
+                self._store(key, analysis)
+            return analysis
 
-Respond with valid JSON only (no markdown, no code blocks):
-{{
-    "is_controversial": true/false,
-    "controversy_score": 0-10,
-    "reasons": ["reason1", "reason2"],
-    "topics": ["politics", "religion", etc]
-}}"""
+    def build_request(self, tweet_text: str) -> Dict:
+        """Chat completion parameters for one tweet (also the body of a Batch API line)."""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": tweet_text}
+            ],
+            "max_tokens": 500,
+            "temperature": 0.3,
+            "response_format": json_schema_format("tweet_analysis", ANALYSIS_SCHEMA)
+        }
+
+    @staticmethod
+    def parse_content(content: Optional[str]) -> Dict:
+        """
+        Parse and validate a single-tweet response into an analysis dictionary.
+        
+        Raises:
+            ValueError: if the content is empty, not JSON (json.JSONDecodeError),
+                or does not match the analysis schema
+        """
+        if not content:
+            raise ValueError("empty response")
+        # Remove markdown code blocks if present
+        analysis = validate_analysis(json.loads(strip_code_fences(content)))
+        if analysis is None:
+            raise ValueError("response does not match the analysis schema")
+        return analysis
 
+    def _analyze_uncached(self, tweet_text: str) -> Tuple[Dict, bool]:
+        """
+        Call the API for one tweet. An invalid reply gets one targeted re-ask
+        that shows the model its own output and the error.
+        Returns the analysis and whether it succeeded.
+        """
+        request = self.build_request(tweet_text)
+        content = ""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500,
-                temperature=0.3
-            )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Remove markdown code blocks if present
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
+            response = self._create(**request)
+            message = response.choices[0].message
+            content = message.content
+            try:
+                return self.parse_content(content), True
+            except ValueError as e:
+                self._count("invalid_responses")
+                self._count("reasks")
+                error = getattr(message, "refusal", None) or str(e)
+                reask = dict(request, messages=request["messages"] + [
+                    {"role": "assistant", "content": content or ""},
+                    {"role": "user", "content": REASK_PROMPT.format(error=error)}
+                ])
+                content = self._create(**reask).choices[0].message.content
+                analysis = self.parse_content(content)
+                self._count("reask_recovered")
+                return analysis, True
             
-            # Parse JSON
-            result = json.loads(content)
+        except ValueError as e:
+            self._count("failed")
+            print(f"Error parsing JSON response after re-ask: {e}")
+            print(f"Response content: {(content or '')[:200]}")
+            return failed_analysis("Failed to parse AI response"), False
+        except openai.RateLimitError as e:
+            # the throttle has already backed off and retried
+            self._count("failed")
+            print(f"OpenAI rate limit still exceeded after retries: {e}")
+            return failed_analysis(f"Analysis error: {str(e)}"), False
+        except Exception as e:
+            self._count("failed")
+            print(f"Error analyzing tweet: {e}")
+            return failed_analysis(f"Analysis error: {str(e)}"), False
+
+    def plan_batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Split tweet indices into batches that fit the input/output token ceilings.
+        
+        Args:
+            texts: The tweet texts to analyze
             
-            # Ensure all required fields exist
-            return {
-                "is_controversial": result.get("is_controversial", False),
-                "controversy_score": result.get("controversy_score", 0),
-                "reasons": result.get("reasons", []),
-                "topics": result.get("topics", [])
-            }
+        Returns:
+            List of batches, each a list of indices into texts
+        """
+        preamble_tokens = estimate_tokens(BATCH_SYSTEM_PROMPT)
+        batches = []
+        current = []
+        input_tokens = preamble_tokens
+        for idx, text in enumerate(texts):
+            # the tweet's json object plus its separator in the array
+            tweet_tokens = estimate_tokens(batch_entry(idx, text)) + 1
+            fits_input = input_tokens + tweet_tokens <= self.max_input_tokens
+            fits_output = (len(current) + 1) * OUTPUT_TOKENS_PER_TWEET <= self.max_output_tokens
+            if current and not (fits_input and fits_output):
+                batches.append(current)
+                current = []
+                input_tokens = preamble_tokens
+            current.append(idx)
+            input_tokens += tweet_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def analyze_batch(self, texts: List[str]) -> List[Dict]:
+        """
+        Analyze several tweets with as few chat completions as the token budget allows.
+        Cached analyses are reused; entries missing from or malformed in a batched
+        response are re-run one at a time.
+        
+        Args:
+            texts: The text content of each tweet
             
+        Returns:
+            List of analysis dictionaries (same shape as analyze_controversy), in input order
+        """
+        with METRICS.span("analyze_batch"):
+            return self._analyze_batch(texts)
+
+    def _analyze_batch(self, texts: List[str]) -> List[Dict]:
+        keys = [self._cache_key(text) for text in texts]
+        results: List[Optional[Dict]] = [self._cached(key) for key in keys]
+        todo = [idx for idx, result in enumerate(results) if result is None]
+
+        for batch in self.plan_batches([texts[idx] for idx in todo]):
+            batch = [todo[position] for position in batch]
+            if len(batch) == 1:
+                continue
+            parsed = self._request_batch([texts[idx] for idx in batch])
+            for position, idx in enumerate(batch):
+                if position in parsed:
+                    results[idx] = parsed[position]
+                    self._store(keys[idx], parsed[position])
+
+        # re-run only the entries the batched responses didn't cover
+        for idx in todo:
+            if results[idx] is None:
+                results[idx], succeeded = self._analyze_uncached(texts[idx])
+                if succeeded:
+                    self._store(keys[idx], results[idx])
+        return results
+
+    def _request_batch(self, texts: List[str]) -> Dict[int, Dict]:
+        """Send one batched prompt and return the valid analyses keyed by position."""
+        # a json array keeps tweets apart even when their text contains newlines or "[n]"
+        entries = "[" + ", ".join(batch_entry(idx, text) for idx, text in enumerate(texts)) + "]"
+        content = ""
+        try:
+            response = self._create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                    {"role": "user", "content": entries}
+                ],
+                max_tokens=self.max_output_tokens,
+                temperature=0.3,
+                response_format=json_schema_format("tweet_analyses", BATCH_ANALYSIS_SCHEMA)
+            )
+            content = strip_code_fences(response.choices[0].message.content or "")
+            items = json.loads(content)
         except json.JSONDecodeError as e:
-            print(f"Error parsing JSON response: {e}")
+            self._count("invalid_responses")
+            print(f"Error parsing batched JSON response: {e}")
             print(f"Response content: {content[:200]}")
-            # Return default structure on parse error
-            return {
-                "is_controversial": False,
-                "controversy_score": 0,
-                "reasons": ["Failed to parse AI response"],
-                "topics": []
-            }
-        except openai.RateLimitError:
-            print("OpenAI rate limit exceeded. Waiting 60 seconds...")
-            time.sleep(60)
-            # Retry once
-            return self.analyze_controversy(tweet_text)
+            return {}
+        except openai.RateLimitError as e:
+            # the throttle has already backed off and retried; entries fall back to single calls
+            print(f"OpenAI rate limit still exceeded after retries: {e}")
+            return {}
         except Exception as e:
-            print(f"Error analyzing tweet: {e}")
-            return {
-                "is_controversial": False,
-                "controversy_score": 0,
-                "reasons": [f"Analysis error: {str(e)}"],
-                "topics": []
-            }
\ No newline at end of file
+            print(f"Error analyzing tweet batch: {e}")
+            return {}
+
+        if isinstance(items, dict):
+            items = items.get("results")
+        if not isinstance(items, list):
+            self._count("invalid_responses")
+            return {}
+        parsed = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            index = item.get("index")
+            if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(texts):
+                continue
+            analysis = validate_analysis(item)
+            if analysis is not None:
+                parsed[index] = analysis
+        return parsed
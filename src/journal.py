@@ -0,0 +1,66 @@
+"""
+run journal for resumable scans.
+every finished analysis is appended to a jsonl journal as soon as it comes
+back, so a run killed by an outage or ctrl-c can be restarted with --resume
+and only pay for the tweets it had not analyzed yet. the journal is removed
+once the run has written all of its reports.
+"""
+
+import json
+import os
+from typing import Dict
+
+
+class RunJournal:
+    def __init__(self, path: str, resume: bool = False):
+        """
+        args:
+            path: journal file (json lines)
+            resume: keep the entries of an earlier run; otherwise any old journal is discarded
+        """
+        self.path = path
+        self._file = None
+        if not resume and os.path.exists(path):
+            os.remove(path)
+
+    def completed(self, username: str) -> Dict[int, Dict]:
+        """
+        analyses journaled for a profile by earlier runs.
+        args:
+            username: twitter username (without @)
+        returns:
+            {tweet_id: analysis}
+        """
+        done = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # the last line may have been cut off when the run died
+                        continue
+                    if entry.get('username') == username.lower():
+                        done[int(entry['tweet_id'])] = entry['analysis']
+        except FileNotFoundError:
+            pass
+        return done
+
+    def record(self, username: str, tweet_id: int, analysis: Dict):
+        """append one finished analysis and flush it to disk right away."""
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps({'username': username.lower(), 'tweet_id': tweet_id,
+                                     'analysis': analysis}, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def clear(self):
+        """delete the journal once every report of the run has been written."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
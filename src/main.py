@@ -5,24 +5,38 @@ Searches a Twitter/X profile for tweets containing controversial keywords
 and analyzes them using AI to identify controversial content.
 """
 
+from __future__ import annotations
+
 import os
 import sys
 import json
 import argparse
 from datetime import datetime
-from typing import Dict
-import tweepy
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Dict, List, Optional
 
-from analyzer import TwitterSearcher
-from extractor import ControversyAnalyzer
+from pool import AnalysisPool
+from records import Analysis, Tweet
+from report import (JsonlReportWriter, ReportIndex, controversial_entries, expand_report, report_entries,
+                    serialize_report, with_entries)
+from cache import AnalysisCache
+from journal import RunJournal
+from prefilter import DEFAULT_THRESHOLD, PreFilter
+from batch import BatchAnalysisPool, BatchAnalysisRunner
+from query import DEFAULT_MAX_QUERY_LENGTH, min_query_length
 from keywords import CONTROVERSIAL_KEYWORDS
+from metrics import METRICS
 
-load_dotenv()
+# tweepy, openai, requests and dotenv are imported only once a scan actually starts,
+# so --help and argument errors return without paying for them
+if TYPE_CHECKING:
+    from analyzer import TwitterSearcher
+    from extractor import ControversyAnalyzer
 
 
 def load_api_keys():
-    """load api keys from environment variables."""
+    """load api keys from environment variables (and a .env file, if present)."""
+    from dotenv import load_dotenv
+    load_dotenv()
     twitter_bearer_token = os.getenv("X_BEARER_TOKEN")
     openai_api_key = os.getenv("OPENAI_API_KEY")
     if not twitter_bearer_token:
@@ -35,128 +49,313 @@ def load_api_keys():
 
 
 def analyze_profile(username: str, twitter_searcher: TwitterSearcher, 
-                   analyzer: ControversyAnalyzer) -> Dict:
+                   analyzer: ControversyAnalyzer, pool: AnalysisPool = None,
+                   since_id: int = None, validate: bool = True, writer: JsonlReportWriter = None,
+                   journal: RunJournal = None, source: str = 'search',
+                   retry_tweets: List[Tweet] = None) -> Dict:
     """
     analyze a twitter profile for controversial tweets.
     args:
         username: twitter username (without @)
         twitter_searcher: twittersearcher instance
         analyzer: controversyanalyzer instance
+        pool: analysispool used to run llm analysis concurrently (default: sequential)
+        since_id: only search tweets newer than this id (incremental scan)
+        validate: check that the user exists first (skip when already validated in bulk)
+        writer: stream each tweet row to this jsonl writer as it completes; only controversial
+            rows are then kept in the returned results
+        journal: run journal; tweets it already holds an analysis for are not analyzed again,
+            and every new analysis is recorded in it
+        source: 'search' runs keyword search queries; 'timeline' pages through the user's
+            timeline once and matches keywords locally
+        retry_tweets: tweets from an earlier report whose analysis failed; they are analyzed
+            again after the search results unless the search returned them too
     returns:
         dictionary with analysis results
     """
+    import tweepy
+    
     print(f"{'*'*60}")
     print(f"analyzing profile: @{username}")
     print(f"{'*'*60}\n")
     
     # validate user exists
-    if not twitter_searcher.validate_user(username):
+    if validate and not twitter_searcher.validate_user(username):
         print(f"error: user '@{username}' not found or account is private.")
         sys.exit(1)
     
-    all_results = []
-    controversial_tweets = []
-    
-    print(f"searching for tweets containing {len(CONTROVERSIAL_KEYWORDS)} controversial keywords using batch search...\n")
-    
-    # batch search for all keywords at once using OR operators
-    try:
-        tweets = twitter_searcher.search_tweets_by_keywords_batch(username, CONTROVERSIAL_KEYWORDS)
-    except tweepy.BadRequest:
-        # query might be too long, fall back to individual searches
-        print("batch query failed (possibly too long), falling back to individual keyword searches...\n")
-        tweets = []
-        for idx, keyword in enumerate(CONTROVERSIAL_KEYWORDS, 1):
-            print(f"[{idx}/{len(CONTROVERSIAL_KEYWORDS)}] searching for keyword: '{keyword}'...", end=" ", flush=True)
-            keyword_tweets = twitter_searcher.search_tweets_by_keyword(username, keyword)
-            # add matched_keywords field for consistency
-            for tweet in keyword_tweets:
-                tweet['matched_keywords'] = [keyword]
-            tweets.extend(keyword_tweets)
-            print(f"found {len(keyword_tweets)} tweet(s)")
-    
-    total_tweets_found = len(tweets)
+    rows = []
+    index = ReportIndex(CONTROVERSIAL_KEYWORDS)
+    cache_start = analyzer.cache.stats() if analyzer.cache is not None else None
+    responses_start = analyzer.stats()
+    usage_start = analyzer.usage()
+    metrics_start = METRICS.mark()
     
-    print(f"\nfound {total_tweets_found} total tweet(s) matching keywords\n")
+    if source == 'timeline':
+        print(f"reading the timeline and matching {len(CONTROVERSIAL_KEYWORDS)} controversial keywords locally...\n")
+        pages = twitter_searcher.iter_timeline_pages(username, CONTROVERSIAL_KEYWORDS, since_id=since_id)
+    else:
+        print(f"searching for tweets containing {len(CONTROVERSIAL_KEYWORDS)} controversial keywords using batch search...\n")
+        # batch search for all keywords at once using OR operators
+        pages = twitter_searcher.iter_tweet_pages(username, CONTROVERSIAL_KEYWORDS, since_id=since_id)
     
-    # track analyzed tweet IDs to avoid duplicate analysis
+    total_tweets_found = 0
     analyzed_tweet_ids = set()
     
-    # analyze each tweet
-    for idx, tweet in enumerate(tweets, 1):
-        tweet_id = tweet['id']
+    def stream_tweets():
+        """yield unique matching tweets page by page as the search produces them."""
+        nonlocal total_tweets_found
+        try:
+            for page in pages:
+                total_tweets_found += len(page)
+                for tweet in page:
+                    # de-duplicate by tweet id before analysis (safe guard)
+                    if tweet.id not in analyzed_tweet_ids:
+                        analyzed_tweet_ids.add(tweet.id)
+                        yield tweet
+        except tweepy.BadRequest:
+            # query might be too long, fall back to individual searches
+            print("batch query failed (possibly too long), falling back to individual keyword searches...\n")
+            # each keyword's tweets arrive as soon as its search finishes
+            for page in twitter_searcher.search_tweets_by_keywords_parallel(
+                    username, CONTROVERSIAL_KEYWORDS, since_id=since_id):
+                total_tweets_found += len(page)
+                for tweet in page:
+                    if tweet.id not in analyzed_tweet_ids:
+                        analyzed_tweet_ids.add(tweet.id)
+                        yield tweet
         
-        # skip if already analyzed (shouldn't happen with batch search, but safe guard)
-        if tweet_id in analyzed_tweet_ids:
-            continue
+        retry = [tweet for tweet in retry_tweets or [] if tweet.id not in analyzed_tweet_ids]
+        if retry:
+            print(f"retrying {len(retry)} tweet(s) whose analysis failed in the previous report...\n")
+        for tweet in retry:
+            analyzed_tweet_ids.add(tweet.id)
+            yield tweet
+    
+    if pool is None:
+        pool = AnalysisPool(analyzer, workers=1)
+    
+    # analyses finished by an interrupted earlier run
+    done = journal.completed(username) if journal is not None else {}
+    if done:
+        print(f"resuming: {len(done)} tweet(s) already analyzed by the previous run\n")
+    
+    # analyze tweets concurrently while later pages are still loading;
+    # results come back in original tweet order
+    analyzed = pool.imap(stream_tweets(), preset_of=lambda tweet: done.get(tweet.id))
+    for idx, (tweet, analysis) in enumerate(analyzed, 1):
+        # failed analyses are left out of the journal so a resumed run retries them
+        if journal is not None and tweet.id not in done and not analysis.get('analysis_failed'):
+            journal.record(username, tweet.id, analysis)
         
-        analyzed_tweet_ids.add(tweet_id)
+        # one compact analysis record per tweet, kept next to its Tweet until a report is written
+        analysis = Analysis.from_dict(analysis)
+        index.add(tweet, analysis)
+        if writer is not None:
+            writer.write_tweet(tweet, analysis)
+        if writer is None or analysis.is_controversial:
+            rows.append((tweet, analysis))
         
-        matched_keywords = tweet.get('matched_keywords', [])
+        matched_keywords = tweet.matched_keywords
         keyword_display = ', '.join(matched_keywords) if matched_keywords else 'unknown'
         
-        print(f"[{idx}/{total_tweets_found}] analyzing tweet id: {tweet_id} (keywords: {keyword_display})...", end=" ", flush=True)
-        analysis = analyzer.analyze_controversy(tweet['text'])
-        
-        # create result for each matched keyword (for backward compatibility with reporting)
-        for keyword in matched_keywords:
-            result = {
-                'tweet_id': tweet_id,
-                'text': tweet['text'],
-                'created_at': tweet['created_at'],
-                'keyword': keyword,
-                'matched_keywords': matched_keywords,  # include all matched keywords
-                'public_metrics': tweet['public_metrics'],
-                'analysis': analysis
-            }
-            
-            all_results.append(result)
+        print(f"[{idx}] analyzed tweet id: {tweet.id} (keywords: {keyword_display})...", end=" ", flush=True)
         
-        # add to controversial tweets only once per tweet (deduplicated)
-        if analysis['is_controversial']:
-            # use first matched keyword for the controversial tweet entry
-            primary_keyword = matched_keywords[0] if matched_keywords else 'unknown'
-            controversial_result = {
-                'tweet_id': tweet_id,
-                'text': tweet['text'],
-                'created_at': tweet['created_at'],
-                'keyword': primary_keyword,
-                'matched_keywords': matched_keywords,
-                'public_metrics': tweet['public_metrics'],
-                'analysis': analysis
-            }
-            controversial_tweets.append(controversial_result)
-            print(f"CONTROVERSIAL (score: {analysis['controversy_score']}/10)")
+        if analysis.analysis_failed:
+            print("analysis failed")
+        elif analysis.is_controversial:
+            print(f"CONTROVERSIAL (score: {analysis.controversy_score}/10)")
+        elif analysis.skipped:
+            print(f"skipped by pre-filter ({analysis.skip_reason})")
         else:
-            print(f"not controversial (score: {analysis['controversy_score']}/10)")
-        
-        # if no keywords matched (shouldn't happen, but handle gracefully)
-        if not matched_keywords:
-            result = {
-                'tweet_id': tweet_id,
-                'text': tweet['text'],
-                'created_at': tweet['created_at'],
-                'keyword': 'unknown',
-                'matched_keywords': [],
-                'public_metrics': tweet['public_metrics'],
-                'analysis': analysis
-            }
-            all_results.append(result)
-    
-    return {
+            print(f"not controversial (score: {analysis.controversy_score}/10)")
+    
+    print(f"\nfound {total_tweets_found} total tweet(s) matching keywords\n")
+    
+    results = {
         'username': username,
         'timestamp': datetime.now().isoformat(),
         'keywords_searched': CONTROVERSIAL_KEYWORDS,
+        'source': source,
         'total_tweets_found': total_tweets_found,
-        'controversial_count': len(controversial_tweets),
-        'tweets': all_results,
-        'controversial_tweets': controversial_tweets,
-        'summary': {
-            'total_analyzed': len(all_results),
-            'controversial': len(controversial_tweets),
-            'non_controversial': len(all_results) - len(controversial_tweets)
-        }
+        # false if a search request failed, so tweets may be missing
+        'search_complete': twitter_searcher.search_complete(username),
+        # newest tweet the report is complete up to; incremental runs on the report resume from it
+        'newest_tweet_id': index.newest_id,
+        # one (Tweet, Analysis) pair per tweet, indexed by keyword and controversy
+        **index.fields(),
+        'tweets': rows
     }
+    results['llm_throttle'] = analyzer.throttle.stats()
+    
+    results['llm_responses'] = counter_delta(responses_start, analyzer.stats())
+    results['llm_usage'] = counter_delta(usage_start, analyzer.usage())
+    
+    if cache_start is not None:
+        results['cache'] = counter_delta(cache_start, analyzer.cache.stats())
+    
+    # this profile's spans and tokens only; its report write happens after this is taken,
+    # so report_write shows up in the run summary and --prometheus export instead
+    results['metrics'] = run_metrics(analyzer, since=metrics_start, usage_start=usage_start)
+    
+    return results
+
+
+def counter_delta(start: Dict, end: Dict) -> Dict:
+    """per-profile counts from two snapshots of process-wide counters."""
+    return {name: end[name] - start.get(name, 0) for name in end}
+
+
+def run_metrics(analyzer: ControversyAnalyzer, since: Dict = None, usage_start: Dict = None) -> Dict:
+    """
+    timing and throughput plus the llm tokens used, for the whole run so far or since a snapshot.
+    args:
+        analyzer: controversyanalyzer whose token usage is reported
+        since: METRICS.mark() snapshot to start from (default: the start of the run)
+        usage_start: analyzer.usage() taken together with since
+    """
+    metrics = METRICS.summary(since)
+    metrics['llm_tokens'] = counter_delta(usage_start or {}, analyzer.usage())
+    return metrics
+
+
+def print_metrics_summary(metrics: Dict):
+    """print per-stage latency percentiles, call rates, sleep time and token usage."""
+    print(f"\n{'='*60}")
+    print("run metrics")
+    print(f"{'='*60}\n")
+    print(f"elapsed: {metrics['elapsed_seconds']:.1f}s, "
+          f"time spent sleeping on rate limits: {metrics['total_sleep_seconds']:.1f}s")
+    for name, span in metrics['spans'].items():
+        print(f"{name}: {span['count']} call(s), {span['calls_per_second']}/s, "
+              f"p50={span['p50_seconds'] * 1000:.0f}ms p95={span['p95_seconds'] * 1000:.0f}ms "
+              f"p99={span['p99_seconds'] * 1000:.0f}ms")
+    tokens = metrics['llm_tokens']
+    print(f"llm tokens: {tokens['prompt_tokens'] + tokens['completion_tokens']} "
+          f"in {tokens['requests']} request(s)")
+
+
+def save_prometheus_metrics(output_file: str):
+    """write the run metrics in prometheus text format (e.g. for a node_exporter textfile collector)."""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(METRICS.prometheus())
+    print(f"metrics saved to: {output_file}")
+
+
+def load_previous_report(output_file: str, username: str) -> Optional[Dict]:
+    """
+    load an earlier json report for the same profile, if one exists.
+    args:
+        output_file: path of the report written by the previous run
+        username: twitter username (without @)
+    returns:
+        the previous results dictionary (its newest_tweet_id is where the incremental scan resumes),
+        or None if missing, unreadable or for another user
+    """
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"warning: could not read previous report '{output_file}': {e}")
+        return None
+    if str(previous.get('username', '')).lower() != username.lower():
+        return None
+    return previous
+
+
+def merge_reports(current: Dict, previous: Dict) -> Dict:
+    """
+    merge the results of an incremental scan with the previous report.
+    tweets from the current scan come first; previous entries for the same tweet id are replaced.
+    args:
+        current: results dictionary from this run
+        previous: report written by the earlier run (normalized or legacy shape)
+    returns:
+        merged results dictionary
+    """
+    current_ids = {tweet.id for tweet, _ in current['tweets']}
+    entries = current['tweets'] + [(tweet, analysis) for tweet, analysis in report_entries(previous)
+                                   if tweet.id not in current_ids]
+    
+    merged = with_entries(current, entries)
+    merged['total_tweets_found'] = len(entries)
+    return merged
+
+
+def read_usernames(path: str) -> List[str]:
+    """
+    read usernames one per line from a file, or stdin when path is '-'.
+    blank lines and lines starting with '#' are ignored; duplicates are dropped.
+    """
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    
+    usernames = []
+    seen = set()
+    for line in lines:
+        username = line.strip().lstrip('@')
+        if not username or username.startswith('#') or username.lower() in seen:
+            continue
+        seen.add(username.lower())
+        usernames.append(username)
+    return usernames
+
+
+def scan_profile(username: str, twitter_searcher: TwitterSearcher, analyzer: ControversyAnalyzer,
+                 pool: AnalysisPool, output_file: str = None,
+                 incremental: bool = False, validate: bool = True, writer: JsonlReportWriter = None,
+                 journal: RunJournal = None, source: str = 'search') -> Dict:
+    """
+    analyze one profile, resuming from the report it extends when running incrementally.
+    args:
+        username: twitter username (without @)
+        twitter_searcher: twittersearcher instance
+        analyzer: controversyanalyzer instance
+        pool: analysispool used to run llm analysis
+        output_file: path of the previous report this scan extends (incremental only)
+        incremental: only fetch tweets newer than the previous report's newest_tweet_id and merge
+            with that report, analyzing its failed rows again
+        validate: check that the user exists first
+        writer: optional jsonl writer the tweets are streamed to
+        journal: optional run journal for resumable runs
+        source: where tweets come from, 'search' or 'timeline'
+    returns:
+        dictionary with analysis results
+    """
+    # the resume point is read from the report being extended, so runs writing other files
+    # (or not running incrementally) can never move it past tweets this report is missing
+    since_id = None
+    previous = None
+    retry_tweets = []
+    if incremental and output_file:
+        previous = load_previous_report(output_file, username)
+    if previous is not None:
+        since_id = previous.get('newest_tweet_id')
+        if since_id is not None:
+            print(f"incremental scan: fetching tweets newer than {since_id}\n")
+        # tweets older than since_id are not searched again, so failed analyses are retried here
+        retry_tweets = [tweet for tweet, analysis in report_entries(previous) if analysis.analysis_failed]
+    
+    results = analyze_profile(username, twitter_searcher, analyzer, pool,
+                              since_id=since_id, validate=validate, writer=writer, journal=journal,
+                              source=source, retry_tweets=retry_tweets)
+    if previous is not None:
+        results = merge_reports(results, previous)
+    
+    if not results['search_complete']:
+        # results are newest first, so a search that stopped early may have skipped tweets
+        # between since_id and the last page it got: keep resuming from since_id
+        print(f"warning: the search for @{username} did not finish; tweets may be missing, "
+              f"and an incremental run on this report fetches them again")
+        results['newest_tweet_id'] = since_id
+    elif results['newest_tweet_id'] is None:
+        results['newest_tweet_id'] = since_id
+    return results
 
 
 def print_console_report(results: Dict):
@@ -172,13 +371,32 @@ def print_console_report(results: Dict):
     print(f"tweets analyzed: {results['summary']['total_analyzed']}")
     print(f"controversial tweets: {results['summary']['controversial']}")
     print(f"non-controversial tweets: {results['summary']['non_controversial']}")
+    if results['summary'].get('analysis_failed'):
+        print(f"analysis failed (no verdict): {results['summary']['analysis_failed']}")
+    if results['summary'].get('skipped_by_prefilter'):
+        print(f"skipped by pre-filter (no llm call): {results['summary']['skipped_by_prefilter']}")
+    if 'llm_throttle' in results:
+        throttle = results['llm_throttle']
+        print(f"llm concurrency limit: {throttle['concurrency_limit']} "
+              f"({throttle['rate_limited']} rate limit(s), {throttle['retries']} retries)")
+    if results.get('llm_responses', {}).get('invalid_responses'):
+        responses = results['llm_responses']
+        print(f"invalid llm responses: {responses['invalid_responses']} "
+              f"({responses['reask_recovered']} recovered by re-ask, {responses['failed']} failed)")
+    if results.get('llm_usage', {}).get('requests'):
+        usage = results['llm_usage']
+        print(f"llm tokens: {usage['prompt_tokens']} prompt "
+              f"({usage['cached_prompt_tokens']} served from prompt cache), "
+              f"{usage['completion_tokens']} completion")
+    if 'cache' in results:
+        print(f"analysis cache: {results['cache']['hits']} hit(s), {results['cache']['misses']} miss(es)")
     
     if results['controversial_count'] > 0:
         print(f"\n{'='*60}")
         print("controversial tweets")
         print(f"{'='*60}\n")
         
-        for idx, tweet in enumerate(results['controversial_tweets'], 1):
+        for idx, tweet in enumerate(controversial_entries(results), 1):
             analysis = tweet['analysis']
             print(f"[{idx}] tweet id: {tweet['tweet_id']}")
             print(f"    keyword: {tweet['keyword']}")
@@ -196,43 +414,326 @@ def print_console_report(results: Dict):
         print(f"{'='*60}\n")
 
 
-def save_json_report(results: Dict, output_file: str):
-    """save results to json file."""
-    with open(output_file, 'w', encoding='utf-8') as f:
+def save_json_report(results: Dict, output_file: str, legacy: bool = False):
+    """save results to json file, in the legacy expanded shape if requested."""
+    results = expand_report(results) if legacy else serialize_report(results)
+    with METRICS.span('report_write'), open(output_file, 'w', encoding='utf-8') as f:
         json.dump(results, f, indent=2, ensure_ascii=False)
     print(f"results saved to: {output_file}")
 
 
+def append_jsonl_report(results: Dict, output_file: str, legacy: bool = False):
+    """append results as a single line to a combined jsonl file."""
+    results = expand_report(results) if legacy else serialize_report(results)
+    with METRICS.span('report_write'), open(output_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(results, ensure_ascii=False) + '\n')
+    print(f"results for @{results['username']} appended to: {output_file}")
+
+
+def stream_profile(username: str, output_file: str, twitter_searcher: TwitterSearcher,
+                   analyzer: ControversyAnalyzer, pool: AnalysisPool,
+                   validate: bool = True, journal: RunJournal = None, source: str = 'search') -> Dict:
+    """scan one profile, streaming its tweets to a jsonl report and ending it with the summary trailer."""
+    writer = JsonlReportWriter(output_file)
+    try:
+        results = scan_profile(username, twitter_searcher, analyzer, pool,
+                               validate=validate, writer=writer, journal=journal, source=source)
+    except BaseException:
+        # keep the rows written so far, without a trailer
+        writer.close()
+        raise
+    with METRICS.span('report_write'):
+        writer.close(results)
+    print(f"results streamed to: {output_file}")
+    return results
+
+
+def run_batch(usernames: List[str], args, twitter_searcher: TwitterSearcher,
+              analyzer: ControversyAnalyzer, pool: AnalysisPool,
+              journal: RunJournal = None):
+    """
+    scan many profiles in one process, sharing clients, cache and worker pool.
+    users are validated in bulk first; each report is written as soon as its profile finishes.
+    """
+    print(f"validating {len(usernames)} username(s)...")
+    existing = twitter_searcher.validate_users(usernames)
+    valid_usernames = [username for username in usernames if username.lower() in existing]
+    for username in usernames:
+        if username.lower() not in existing:
+            print(f"skipping '@{username}': not found or account is private.")
+    
+    if args.combined_jsonl is None:
+        os.makedirs(args.output_dir, exist_ok=True)
+    
+    for idx, username in enumerate(valid_usernames, 1):
+        print(f"\n[{idx}/{len(valid_usernames)}] @{username}")
+        if args.format == 'jsonl':
+            results = stream_profile(username, os.path.join(args.output_dir, f"{username}.jsonl"),
+                                     twitter_searcher, analyzer, pool, validate=False,
+                                     journal=journal, source=args.source)
+        else:
+            output_file = None
+            if args.combined_jsonl is None:
+                output_file = os.path.join(args.output_dir, f"{username}.json")
+            
+            results = scan_profile(username, twitter_searcher, analyzer, pool,
+                                   output_file=output_file, incremental=args.incremental, validate=False,
+                                   journal=journal, source=args.source)
+            
+            if output_file is None:
+                append_jsonl_report(results, args.combined_jsonl, legacy=args.legacy_report)
+            else:
+                save_json_report(results, output_file, legacy=args.legacy_report)
+        print(f"@{username}: {results['summary']['total_analyzed']} analyzed, "
+              f"{results['summary']['controversial']} controversial")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="analyze twitter/x profile for controversial tweets"
     )
     parser.add_argument(
         'username',
+        nargs='?',
         help='twitter username (without @)'
     )
+    parser.add_argument(
+        '--usernames-file',
+        help="scan every username in this file (one per line, '-' for stdin) in a single process"
+    )
+    parser.add_argument(
+        '--output-dir',
+        default='reports',
+        help='directory for per-user json reports in --usernames-file mode (default: reports)'
+    )
+    parser.add_argument(
+        '--combined-jsonl',
+        help='in --usernames-file mode, append every report as one line to this jsonl file instead'
+    )
     parser.add_argument(
         '-o', '--output',
         default='output.json',
         help='output json file path (default: output.json)'
     )
+    parser.add_argument(
+        '--source',
+        choices=['search', 'timeline'],
+        default='search',
+        help='search: keyword search queries (last 7 days); timeline: read the user\'s timeline once '
+             '(up to 3200 most recent tweets) and match keywords locally (default: search)'
+    )
+    parser.add_argument(
+        '--max-query-length',
+        type=int,
+        default=DEFAULT_MAX_QUERY_LENGTH,
+        help=f'search query length limit of your x api access level (default: {DEFAULT_MAX_QUERY_LENGTH})'
+    )
+    parser.add_argument(
+        '--search-workers',
+        type=int,
+        default=4,
+        help='concurrent per-keyword searches when the combined query is rejected (default: 4)'
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=4,
+        help='number of concurrent llm analysis workers (default: 4)'
+    )
+    parser.add_argument(
+        '--initial-concurrency',
+        type=int,
+        default=None,
+        help='concurrent llm requests at start; ramps up to --workers and halves on 429s (default: min(4, workers))'
+    )
+    parser.add_argument(
+        '--max-in-flight',
+        type=int,
+        default=None,
+        help='maximum tweets queued for analysis at once (default: 2 x workers x llm batch size)'
+    )
+    parser.add_argument(
+        '--llm-batch-size',
+        type=int,
+        default=1,
+        help='tweets packed into one llm prompt (default: 1)'
+    )
+    parser.add_argument(
+        '--max-input-tokens',
+        type=int,
+        default=6000,
+        help='estimated prompt token ceiling per batched llm request (default: 6000)'
+    )
+    parser.add_argument(
+        '--max-output-tokens',
+        type=int,
+        default=4000,
+        help='completion token ceiling per batched llm request (default: 4000)'
+    )
+    parser.add_argument(
+        '--http2',
+        action='store_true',
+        help='send openai requests over http/2 (needs the h2 package)'
+    )
+    parser.add_argument(
+        '--llm-mode',
+        choices=['interactive', 'batch'],
+        default='interactive',
+        help='interactive requests, or one openai batch api job per profile for large offline scans (default: interactive)'
+    )
+    parser.add_argument(
+        '--batch-poll-interval',
+        type=float,
+        default=30.0,
+        help='seconds between batch api status checks in --llm-mode batch (default: 30)'
+    )
+    parser.add_argument(
+        '--prefilter',
+        action='store_true',
+        help='label tweets the local pre-filter scores as harmless without an llm call (off by default)'
+    )
+    parser.add_argument(
+        '--prefilter-threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f'with --prefilter, local score below which tweets skip llm analysis (default: {DEFAULT_THRESHOLD})'
+    )
+    parser.add_argument(
+        '--cache',
+        default='.cleanmyx_cache.sqlite',
+        help='sqlite file caching llm analyses across runs (default: .cleanmyx_cache.sqlite)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='disable the analysis cache'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        type=float,
+        default=30 * 24 * 3600,
+        help='seconds before a cached analysis expires (default: 30 days)'
+    )
+    parser.add_argument(
+        '--cache-max-entries',
+        type=int,
+        default=100000,
+        help='maximum cached analyses kept, least recently used evicted first (default: 100000)'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='only fetch tweets newer than the newest one in the existing output file and merge them into it'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='continue an interrupted run: tweets recorded in the journal are not analyzed again'
+    )
+    parser.add_argument(
+        '--journal',
+        default='.cleanmyx_journal.jsonl',
+        help='file recording each finished analysis until the run completes (default: .cleanmyx_journal.jsonl)'
+    )
+    parser.add_argument(
+        '--format',
+        choices=['json', 'jsonl'],
+        default='json',
+        help='json: one report written at the end; jsonl: stream each analyzed tweet as a line, '
+             'then a summary trailer (default: json)'
+    )
+    parser.add_argument(
+        '--legacy-report',
+        action='store_true',
+        help="write reports in the old expanded shape (one row per matched keyword plus 'controversial_tweets')"
+    )
+    parser.add_argument(
+        '--prometheus',
+        metavar='PATH',
+        help='also write the run metrics to this file in prometheus text format'
+    )
     
     args = parser.parse_args()
+    if (args.username is None) == (args.usernames_file is None):
+        parser.error('provide exactly one of username or --usernames-file')
+    if args.incremental and args.combined_jsonl:
+        parser.error('--incremental needs per-user reports to merge into; it cannot be used with --combined-jsonl')
+    if args.format == 'jsonl' and (args.incremental or args.combined_jsonl or args.legacy_report):
+        parser.error('--format jsonl cannot be combined with --incremental, --combined-jsonl or --legacy-report')
+    
+    usernames = [args.username] if args.usernames_file is None else read_usernames(args.usernames_file)
+    if args.source == 'search':
+        # keywords are packed into OR-queries, but each one must fit in a query on its own
+        required = max((min_query_length(username, CONTROVERSIAL_KEYWORDS) for username in usernames), default=0)
+        if args.max_query_length < required:
+            parser.error(f'--max-query-length {args.max_query_length} is too short: a query for the longest '
+                         f'keyword needs {required} characters')
+    
+    from analyzer import TwitterSearcher
+    from extractor import ControversyAnalyzer
+    from throttle import AdaptiveThrottle
+    from transport import Transport
     
     # load api keys
     twitter_token, openai_key = load_api_keys()
     
     # initialize components
-    twitter_searcher = TwitterSearcher(twitter_token)
-    analyzer = ControversyAnalyzer(openai_key)
+    # pools sized to the concurrency: the fallback's search workers plus the paging thread, and the llm workers
+    transport = Transport(x_connections=args.search_workers + 1, llm_connections=args.workers, http2=args.http2)
+    twitter_searcher = TwitterSearcher(twitter_token, max_query_length=args.max_query_length,
+                                       search_workers=args.search_workers, transport=transport)
+    cache = None
+    if not args.no_cache:
+        cache = AnalysisCache(args.cache, ttl_seconds=args.cache_ttl, max_entries=args.cache_max_entries)
+    throttle = AdaptiveThrottle(initial_limit=args.initial_concurrency or min(4, args.workers),
+                                max_limit=args.workers)
+    analyzer = ControversyAnalyzer(openai_key,
+                                   max_input_tokens=args.max_input_tokens,
+                                   max_output_tokens=args.max_output_tokens,
+                                   cache=cache,
+                                   throttle=throttle,
+                                   transport=transport)
+    prefilter = None
+    if args.prefilter:
+        prefilter = PreFilter(CONTROVERSIAL_KEYWORDS, threshold=args.prefilter_threshold)
+    if args.llm_mode == 'batch':
+        runner = BatchAnalysisRunner(analyzer, poll_interval=args.batch_poll_interval)
+        pool = BatchAnalysisPool(analyzer, runner, workers=args.workers, prefilter=prefilter)
+    else:
+        pool = AnalysisPool(analyzer, workers=args.workers, max_in_flight=args.max_in_flight,
+                            batch_size=args.llm_batch_size, prefilter=prefilter)
     
-    # analyze profile
-    results = analyze_profile(args.username, twitter_searcher, analyzer)
+    journal = RunJournal(args.journal, resume=args.resume)
     
-    # output results
-    print_console_report(results)
-    save_json_report(results, args.output)
+    if args.usernames_file is not None:
+        run_batch(usernames, args, twitter_searcher, analyzer, pool,
+                  journal=journal)
+        finish_run(args, analyzer, journal)
+        return
     
+    # analyze profile
+    if args.format == 'jsonl':
+        results = stream_profile(args.username, args.output, twitter_searcher, analyzer, pool,
+                                 journal=journal, source=args.source)
+        print_console_report(results)
+    else:
+        results = scan_profile(args.username, twitter_searcher, analyzer, pool,
+                               output_file=args.output, incremental=args.incremental, journal=journal,
+                               source=args.source)
+        
+        # output results
+        print_console_report(results)
+        save_json_report(results, args.output, legacy=args.legacy_report)
+    
+    finish_run(args, analyzer, journal)
+
+
+def finish_run(args, analyzer: ControversyAnalyzer, journal: RunJournal):
+    """drop the journal now that every report is written, then print and export the run metrics."""
+    journal.clear()
+    print_metrics_summary(run_metrics(analyzer))
+    if args.prometheus:
+        save_prometheus_metrics(args.prometheus)
     print(f"\nAnalysis complete!")
 
 
@@ -0,0 +1,57 @@
+"""
+compiled keyword matcher.
+finds which keywords occur in a tweet in one regex pass, matching whole words
+only (so "ass" does not match "class") after unicode normalization and case folding.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List, Sequence
+
+
+def normalize(text: str) -> str:
+    """fold compatibility characters (full-width letters, ligatures) and case."""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+class KeywordMatcher:
+    def __init__(self, keywords: Sequence[str]):
+        """
+        args:
+            keywords: keywords to match; duplicates are ignored
+        """
+        self.keywords = list(dict.fromkeys(keywords))
+        self._position = {}
+        self._canonical = {}
+        for idx, keyword in enumerate(self.keywords):
+            folded = normalize(keyword)
+            self._canonical.setdefault(folded, keyword)
+            self._position.setdefault(keyword, idx)
+
+        # longest alternatives first so multi-word keywords win over their prefixes
+        alternation = '|'.join(re.escape(folded) for folded in sorted(self._canonical, key=len, reverse=True))
+        self._pattern = re.compile(rf'(?<!\w)(?:{alternation})(?!\w)') if alternation else None
+
+    def find(self, text: str) -> List[str]:
+        """
+        return the keywords that occur in text as whole words.
+        args:
+            text: tweet text
+        returns:
+            matched keywords (original spelling), in keyword-list order
+        """
+        if self._pattern is None or not text:
+            return []
+        found = {self._canonical[match.group(0)] for match in self._pattern.finditer(normalize(text))}
+        return sorted(found, key=self._position.get)
+
+
+@lru_cache(maxsize=16)
+def _cached_matcher(keywords: tuple) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
+
+
+def get_matcher(keywords: Sequence[str]) -> KeywordMatcher:
+    """return a compiled matcher for keywords, reusing one built earlier for the same list."""
+    return _cached_matcher(tuple(keywords))
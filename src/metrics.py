@@ -0,0 +1,110 @@
+"""
+per-stage timing and throughput instrumentation.
+records durations of named spans (api requests, llm calls, sleeps, report
+writes) for the whole process and summarizes them as
+latency percentiles and call rates, as a dict or in prometheus text format.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+# spans whose time is spent waiting rather than working
+SLEEP_SPANS = ('rate_limit_sleep', 'llm_backoff_sleep')
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    # smallest value with at least fraction of the values at or below it (rounded first so
+    # float error like 0.07 * 100 = 7.000000000000001 cannot push the rank up by one)
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(round(fraction * len(sorted_values), 9)) - 1))
+    return sorted_values[rank]
+
+
+class Metrics:
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._started = clock()
+        self._spans: Dict[str, List[float]] = {}
+
+    @contextmanager
+    def span(self, name: str):
+        """time the enclosed block under name."""
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.record(name, self._clock() - start)
+
+    def record(self, name: str, seconds: float):
+        """record one duration for name (e.g. a sleep whose length is known up front)."""
+        with self._lock:
+            self._spans.setdefault(name, []).append(seconds)
+
+    def mark(self) -> Dict:
+        """snapshot for summary(since=...), e.g. at the start of one profile's scan."""
+        with self._lock:
+            return {'started': self._clock(), 'counts': {name: len(values) for name, values in self._spans.items()}}
+
+    def summary(self, since: Dict = None) -> Dict:
+        """
+        summarize everything recorded so far, or only what was recorded after a mark().
+        args:
+            since: snapshot returned by mark() (default: the whole process)
+        returns:
+            dictionary with elapsed wall time, per-span count / total / p50 / p95 / p99 / max
+            and calls per second, and total sleep time
+        """
+        counts = since['counts'] if since is not None else {}
+        with self._lock:
+            spans = {name: sorted(values[counts.get(name, 0):]) for name, values in self._spans.items()}
+        spans = {name: values for name, values in spans.items() if values}
+        elapsed = self._clock() - (since['started'] if since is not None else self._started)
+
+        span_summary = {}
+        for name, values in sorted(spans.items()):
+            span_summary[name] = {
+                'count': len(values),
+                'total_seconds': round(sum(values), 6),
+                'p50_seconds': round(percentile(values, 0.50), 6),
+                'p95_seconds': round(percentile(values, 0.95), 6),
+                'p99_seconds': round(percentile(values, 0.99), 6),
+                'max_seconds': round(values[-1], 6) if values else 0.0,
+                'calls_per_second': round(len(values) / elapsed, 3) if elapsed > 0 else 0.0
+            }
+        total_sleep = sum(span_summary[name]['total_seconds'] for name in SLEEP_SPANS if name in span_summary)
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'total_sleep_seconds': round(total_sleep, 3),
+            'spans': span_summary
+        }
+
+    def prometheus(self, prefix: str = 'cleanmyx') -> str:
+        """render the summary in prometheus text exposition format."""
+        summary = self.summary()
+        lines = [
+            f'# HELP {prefix}_span_seconds duration of instrumented stages',
+            f'# TYPE {prefix}_span_seconds summary'
+        ]
+        for name, span in summary['spans'].items():
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            for quantile in ('0.5', '0.95', '0.99'):
+                key = 'p' + quantile.split('.')[1].ljust(2, '0') + '_seconds'
+                lines.append(f'{prefix}_span_seconds{{span="{label}",quantile="{quantile}"}} {span[key]}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{label}"}} {span["total_seconds"]}')
+            lines.append(f'{prefix}_span_seconds_count{{span="{label}"}} {span["count"]}')
+
+        lines.append(f'# TYPE {prefix}_elapsed_seconds gauge')
+        lines.append(f'{prefix}_elapsed_seconds {summary["elapsed_seconds"]}')
+        lines.append(f'# TYPE {prefix}_sleep_seconds_total counter')
+        lines.append(f'{prefix}_sleep_seconds_total {summary["total_sleep_seconds"]}')
+        return '\n'.join(lines) + '\n'
+
+
+# process-wide registry used by every instrumented module
+METRICS = Metrics()
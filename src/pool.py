@@ -0,0 +1,106 @@
+"""
+bounded-concurrency analysis stage.
+fans tweets out to a ControversyAnalyzer on a thread pool and hands the
+analyses back in the same order the tweets went in.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from prefilter import skipped_analysis
+from records import Tweet
+
+
+class AnalysisPool:
+    def __init__(self, analyzer, workers: int = 4, max_in_flight: int = None, batch_size: int = 1,
+                 prefilter=None):
+        """
+        args:
+            analyzer: ControversyAnalyzer instance (must be safe to call from several threads)
+            workers: number of threads issuing llm requests
+            max_in_flight: upper bound on submitted-but-not-yet-yielded tweets (default: 2 * workers * batch_size)
+            batch_size: tweets handed to analyzer.analyze_batch per task (1 = one prompt per tweet)
+            prefilter: optional PreFilter; tweets it skips are labelled without an llm call
+        """
+        self.analyzer = analyzer
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(self.batch_size, max_in_flight or self.workers * self.batch_size * 2)
+        self.prefilter = prefilter
+
+    def _analyze_group(self, entries: List[Tuple[str, Optional[Dict]]]) -> List[Dict]:
+        """
+        analyze one task's worth of tweets.
+        entries are (text, preset analysis) pairs; only those without a preset go to the llm.
+        """
+        texts = [text for text, preset in entries if preset is None]
+        if not texts:
+            analyses = iter([])
+        elif len(texts) == 1:
+            analyses = iter([self.analyzer.analyze_controversy(texts[0])])
+        else:
+            analyses = iter(self.analyzer.analyze_batch(texts))
+        return [preset if preset is not None else next(analyses) for _, preset in entries]
+
+    def _preset(self, text: str) -> Optional[Dict]:
+        """pre-filter verdict as a ready-made analysis, or None if the tweet needs the llm."""
+        if self.prefilter is None:
+            return None
+        verdict = self.prefilter.evaluate(text)
+        return skipped_analysis(verdict) if verdict.skip else None
+
+    def imap(self, tweets: Iterable[Tweet],
+             text_of: Callable[[Tweet], str] = lambda tweet: tweet.text,
+             preset_of: Callable[[Tweet], Optional[Dict]] = None) -> Iterator[Tuple[Tweet, Dict]]:
+        """
+        analyze tweets concurrently, yielding (tweet, analysis) pairs in input order.
+        the input iterable is consumed lazily, so at most max_in_flight tweets are
+        pending at any time. tweets are grouped into tasks of batch_size llm-bound
+        tweets; pre-filtered tweets ride along in the group to keep their position.
+        args:
+            tweets: iterable of tweets to analyze
+            text_of: function returning the text to analyze for a tweet
+            preset_of: optional function returning an already known analysis for a tweet
+                (e.g. from a resumed run's journal); such tweets skip the llm and the pre-filter
+        returns:
+            iterator of (tweet, analysis) tuples
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            in_flight = 0
+            group = []
+            entries = []
+            llm_count = 0
+            for tweet in tweets:
+                text = text_of(tweet)
+                preset = preset_of(tweet) if preset_of is not None else None
+                if preset is None:
+                    preset = self._preset(text)
+                group.append(tweet)
+                entries.append((text, preset))
+                if preset is None:
+                    llm_count += 1
+                # a long run of skipped tweets is flushed too, so the group stays bounded
+                if llm_count < self.batch_size and len(group) < self.max_in_flight:
+                    continue
+                while pending and in_flight + len(group) > self.max_in_flight:
+                    head_group, head_future = pending.popleft()
+                    in_flight -= len(head_group)
+                    yield from zip(head_group, head_future.result())
+                pending.append((group, executor.submit(self._analyze_group, entries)))
+                in_flight += len(group)
+                group = []
+                entries = []
+                llm_count = 0
+
+            if group:
+                pending.append((group, executor.submit(self._analyze_group, entries)))
+
+            while pending:
+                head_group, head_future = pending.popleft()
+                yield from zip(head_group, head_future.result())
+
+    def map(self, tweets: Iterable[Tweet]) -> List[Tuple[Tweet, Dict]]:
+        """analyze all tweets and return (tweet, analysis) pairs in input order."""
+        return list(self.imap(tweets))
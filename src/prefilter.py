@@ -0,0 +1,118 @@
+"""
+local pre-filter run before llm analysis.
+scores each tweet with whole-word keyword matches, a small weighted lexicon and
+a few benign-context patterns, so obviously harmless tweets can be labelled
+without an openai call. it is conservative: a keyword next to any hostility
+word always goes to the llm, and only phrases that are never a hot-button
+topic (e.g. "minor league", "cum laude") count as benign context.
+"""
+
+import re
+from typing import Dict, NamedTuple, Sequence
+
+from matcher import get_matcher, normalize
+
+DEFAULT_THRESHOLD = 1.0
+
+# keywords whose most common uses are benign get a low weight; anything not listed weighs 1.0.
+# identity and age terms (gay, lesbian, minor) are deliberately not discounted
+KEYWORD_WEIGHTS = {
+    "hoe": 0.3,
+    "pee": 0.3,
+    "std": 0.4,
+    "urine": 0.2,
+    "cum": 0.5,
+    "anal": 0.5,
+}
+
+# phrases that neutralize the keyword they contain (only when the tweet has no amplifier)
+BENIGN_CONTEXTS = [
+    re.compile(r"\bminor (league|leagues|change|changes|issue|issues|detail|details|key|update|fix|bug|edit|injury|setback)\b"),
+    re.compile(r"\bcum laude\b"),
+    re.compile(r"\bsex (ratio|chromosome|chromosomes)\b"),
+    re.compile(r"\b(garden|farm) hoe\b"),
+    re.compile(r"\burine (test|sample|samples)\b"),
+    re.compile(r"\bstd (test|testing|screening)\b"),
+]
+
+# hostility and intensity markers that raise the score of a keyword hit
+AMPLIFIERS = {
+    "hate": 0.5, "kill": 0.8, "die": 0.5, "disgusting": 0.5, "stupid": 0.4,
+    "idiot": 0.4, "idiots": 0.4, "trash": 0.3, "shut": 0.3, "ban": 0.3,
+    "deserve": 0.4, "sick": 0.3, "evil": 0.4, "liar": 0.4, "liars": 0.4,
+}
+AMPLIFIER_PATTERN = re.compile(r"\b(" + "|".join(AMPLIFIERS) + r")\b")
+MAX_AMPLIFIER_SCORE = 1.5
+
+
+class Verdict(NamedTuple):
+    skip: bool
+    score: float
+    reason: str
+
+
+class PreFilter:
+    def __init__(self, keywords: Sequence[str], threshold: float = DEFAULT_THRESHOLD):
+        """
+        args:
+            keywords: the keyword list tweets were searched with
+            threshold: tweets scoring below this are skipped instead of sent to the llm
+        """
+        self.matcher = get_matcher(keywords)
+        self.threshold = threshold
+
+    def evaluate(self, text: str) -> Verdict:
+        """
+        score a tweet and decide whether it needs llm analysis.
+        args:
+            text: tweet text
+        returns:
+            Verdict(skip, score, reason)
+        """
+        folded = normalize(text)
+        # hostility words are looked at first: with one present, no phrase counts as benign
+        amplifiers = AMPLIFIER_PATTERN.findall(folded)
+        neutralized = folded
+        benign = []
+        if not amplifiers:
+            for pattern in BENIGN_CONTEXTS:
+                match = pattern.search(neutralized)
+                if match:
+                    benign.append(match.group(0))
+                    neutralized = pattern.sub(" ", neutralized)
+
+        matched = self.matcher.find(neutralized)
+        if not matched:
+            if benign:
+                return Verdict(True, 0.0, f"benign context: {', '.join(benign)}")
+            return Verdict(True, 0.0, "no whole-word keyword match")
+
+        score = sum(KEYWORD_WEIGHTS.get(keyword, 1.0) for keyword in matched)
+        score += min(sum(AMPLIFIERS[word] for word in amplifiers), MAX_AMPLIFIER_SCORE)
+        # shouting and stacked exclamation marks read as inflammatory
+        letters = [char for char in text if char.isalpha()]
+        if len(letters) >= 10 and sum(char.isupper() for char in letters) / len(letters) > 0.7:
+            score += 0.3
+        if "!!" in text:
+            score += 0.2
+        score = round(score, 2)
+
+        # a keyword plus any hostility word is never skipped, whatever the threshold
+        if score < self.threshold and not amplifiers:
+            return Verdict(True, score, f"score {score} below threshold {self.threshold} "
+                                        f"(keywords: {', '.join(matched)})")
+        return Verdict(False, score, "")
+
+
+def skipped_analysis(verdict: Verdict) -> Dict:
+    """analysis record for a tweet the pre-filter skipped (same fields as an llm analysis)."""
+    return {
+        "is_controversial": False,
+        "controversy_score": 0,
+        "reasons": [],
+        "topics": [],
+        "skipped": True,
+        "skip_reason": verdict.reason,
+        "prefilter_score": verdict.score
+    }
+
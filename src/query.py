@@ -0,0 +1,70 @@
+"""
+search query planning.
+packs keywords into as few OR-queries as fit the search endpoint's query
+length limit, so a large keyword list never needs the per-keyword fallback.
+"""
+
+from typing import List, Tuple
+
+# search_recent_tweets rejects queries longer than this on self-serve access
+# (pro access allows 1024, enterprise 4096)
+DEFAULT_MAX_QUERY_LENGTH = 512
+
+OR_SEPARATOR = ' OR '
+
+
+def escape_keyword(keyword: str) -> str:
+    """wrap a keyword in quotes if it contains spaces or special characters."""
+    if ' ' in keyword or any(char in keyword for char in ['"', "'", '(', ')']):
+        return f'"{keyword}"'
+    return keyword
+
+
+def build_query(username: str, keywords: List[str]) -> str:
+    """build query with OR operators: from:username (keyword1 OR keyword2 OR ...)"""
+    keywords_query = OR_SEPARATOR.join(escape_keyword(keyword) for keyword in keywords)
+    return f"from:{username} ({keywords_query})"
+
+
+def min_query_length(username: str, keywords: List[str]) -> int:
+    """shortest max_length plan_queries accepts: the query holding only the longest keyword."""
+    longest = max((len(escape_keyword(keyword)) for keyword in keywords), default=0)
+    return len(build_query(username, [])) + longest
+
+
+def plan_queries(username: str, keywords: List[str],
+                 max_length: int = DEFAULT_MAX_QUERY_LENGTH) -> List[Tuple[str, List[str]]]:
+    """
+    bin-pack keywords into OR-queries that each fit within max_length characters.
+    uses first-fit decreasing, which is within a small factor of the optimal
+    number of queries and exact for typical keyword lists.
+    args:
+        username: Twitter username (without @)
+        keywords: keywords to search for (duplicates are ignored)
+        max_length: maximum query length accepted by the endpoint
+    returns:
+        list of (query, keywords in that query) tuples, in keyword-list order
+    raises:
+        ValueError: if a single keyword cannot fit in a query on its own
+    """
+    unique_keywords = list(dict.fromkeys(keywords))
+    budget = max_length - len(build_query(username, []))
+
+    bins = []  # [used length, [keywords]]
+    for keyword in sorted(unique_keywords, key=lambda k: len(escape_keyword(k)), reverse=True):
+        cost = len(escape_keyword(keyword))
+        if cost > budget:
+            raise ValueError(f"keyword '{keyword}' does not fit in a {max_length}-character query")
+        for query_bin in bins:
+            if query_bin[0] + len(OR_SEPARATOR) + cost <= budget:
+                query_bin[0] += len(OR_SEPARATOR) + cost
+                query_bin[1].append(keyword)
+                break
+        else:
+            bins.append([cost, [keyword]])
+
+    # restore original keyword order inside and across queries for readable, stable output
+    position = {keyword: idx for idx, keyword in enumerate(unique_keywords)}
+    planned = [sorted(query_bin[1], key=position.get) for query_bin in bins]
+    planned.sort(key=lambda group: position[group[0]])
+    return [(build_query(username, group), group) for group in planned]
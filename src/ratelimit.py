@@ -0,0 +1,125 @@
+"""
+shared x api rate limiter.
+tracks the x-rate-limit-remaining / x-rate-limit-reset headers of every
+response per endpoint and makes callers wait exactly until the window resets
+once its quota is used up. one instance is shared by every searcher in the
+process, including concurrent ones.
+"""
+
+import re
+import threading
+import time
+from typing import Dict, Mapping, Optional
+
+from metrics import METRICS
+
+# numeric path segments (user ids, tweet ids) share their endpoint's limit
+ID_SEGMENT = re.compile(r'(?<=.)/\d+(?=/|$)')
+# so do the usernames of user lookups (/2/users/by/username/<name>)
+USERNAME_SEGMENT = re.compile(r'(?<=/by/username/)[^/]+')
+
+# wait used when a 429 arrives without a reset header
+DEFAULT_RESET_SECONDS = 60
+# small margin so we don't wake up a moment before the window actually resets
+RESET_MARGIN_SECONDS = 1
+
+
+def endpoint_key(route: str) -> str:
+    """map a request route to the rate-limit bucket it counts against."""
+    return USERNAME_SEGMENT.sub(':username', ID_SEGMENT.sub('/:id', route))
+
+
+class RateLimiter:
+    def __init__(self, clock=time.time, sleep=time.sleep):
+        """
+        args:
+            clock: returns the current unix time (injectable for tests and benchmarks)
+            sleep: blocks for a number of seconds
+        """
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._windows: Dict[str, list] = {}  # endpoint -> [remaining, reset unix time]
+        self.total_sleep = 0.0
+
+    def acquire(self, route: str):
+        """
+        reserve one request against route's window, sleeping until it resets if exhausted.
+        args:
+            route: api route about to be requested
+        """
+        while True:
+            wait = self.reserve(route)
+            if wait <= 0:
+                return
+            self.record_wait(route, wait)
+            self._sleep(wait)
+
+    def reserve(self, route: str) -> float:
+        """
+        non-blocking acquire, for callers that wait on their own (e.g. an event loop).
+        args:
+            route: api route about to be requested
+        returns:
+            0 if a request was reserved, otherwise seconds to wait before trying again
+        """
+        key = endpoint_key(route)
+        with self._lock:
+            window = self._windows.get(key)
+            now = self._clock()
+            if window is None:
+                return 0
+            remaining, reset_at = window
+            if now >= reset_at:
+                # window has rolled over; wait for the next response to learn the new quota
+                del self._windows[key]
+                return 0
+            if remaining > 0:
+                window[0] = remaining - 1
+                return 0
+            return reset_at - now + RESET_MARGIN_SECONDS
+
+    def record_wait(self, route: str, wait: float):
+        """account for a wait returned by reserve before the caller sleeps it off."""
+        with self._lock:
+            self.total_sleep += wait
+        print(f"rate limit reached for {endpoint_key(route)}. waiting {wait:.0f} seconds until reset...")
+        METRICS.record('rate_limit_sleep', wait)
+
+    def update(self, route: str, headers: Mapping[str, str], exhausted: bool = False):
+        """
+        record the quota reported by a response.
+        args:
+            route: api route that was requested
+            headers: response headers
+            exhausted: the response was a 429, so treat the window as used up
+        """
+        remaining = _int_header(headers, 'x-rate-limit-remaining')
+        reset_at = _int_header(headers, 'x-rate-limit-reset')
+        if exhausted:
+            remaining = 0
+            if reset_at is None:
+                reset_at = self._clock() + DEFAULT_RESET_SECONDS
+        if remaining is None or reset_at is None:
+            return
+
+        key = endpoint_key(route)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and window[1] == reset_at:
+                # concurrent responses from the same window: keep the most pessimistic count
+                window[0] = min(window[0], remaining)
+            else:
+                self._windows[key] = [remaining, reset_at]
+
+
+def _int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name) if headers is not None else None
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# process-wide limiter shared by every searcher unless one is injected
+DEFAULT_RATE_LIMITER = RateLimiter()
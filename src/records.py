@@ -0,0 +1,106 @@
+"""
+compact tweet and analysis records.
+tweets are carried as __slots__ dataclasses with int metric fields instead of
+nested dicts, and each tweet's analysis is one record shared by reference
+wherever the tweet is reported. both expand to the json report shape only
+when a report is built.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+METRIC_FIELDS = ('like_count', 'retweet_count', 'reply_count', 'quote_count')
+
+
+def _metric(public_metrics, name: str) -> int:
+    # tweepy hands public_metrics over as a dict; older clients used attribute access
+    if isinstance(public_metrics, dict):
+        value = public_metrics.get(name, 0)
+    else:
+        value = getattr(public_metrics, name, 0)
+    return int(value or 0)
+
+
+@dataclass
+class Tweet:
+    __slots__ = ('id', 'text', 'created_at', 'like_count', 'retweet_count',
+                 'reply_count', 'quote_count', 'matched_keywords')
+    id: int
+    text: str
+    created_at: Optional[str]
+    like_count: int
+    retweet_count: int
+    reply_count: int
+    quote_count: int
+    matched_keywords: List[str]
+
+    @classmethod
+    def from_api(cls, tweet, matched_keywords: List[str] = None) -> 'Tweet':
+        """
+        build a record from a tweepy Tweet.
+        args:
+            tweet: tweepy Tweet requested with created_at and public_metrics fields
+            matched_keywords: keywords the tweet matched
+        returns:
+            Tweet record
+        """
+        metrics = tweet.public_metrics or {}
+        return cls(
+            int(tweet.id),
+            tweet.text,
+            tweet.created_at.isoformat() if tweet.created_at else None,
+            *(_metric(metrics, name) for name in METRIC_FIELDS),
+            matched_keywords if matched_keywords is not None else []
+        )
+
+    @property
+    def public_metrics(self) -> Dict[str, int]:
+        """metrics in the report's nested public_metrics shape."""
+        return {name: getattr(self, name) for name in METRIC_FIELDS}
+
+
+@dataclass
+class Analysis:
+    __slots__ = ('is_controversial', 'controversy_score', 'reasons', 'topics',
+                 'skip_reason', 'prefilter_score', 'analysis_failed')
+    is_controversial: bool
+    controversy_score: int
+    reasons: List[str]
+    topics: List[str]
+    skip_reason: Optional[str]
+    prefilter_score: Optional[float]
+    analysis_failed: bool
+
+    @classmethod
+    def from_dict(cls, analysis: Dict) -> 'Analysis':
+        """build a record from an analysis dictionary (llm, cache, pre-filter or failure)."""
+        return cls(
+            bool(analysis.get('is_controversial', False)),
+            int(analysis.get('controversy_score', 0)),
+            analysis.get('reasons', []),
+            analysis.get('topics', []),
+            analysis.get('skip_reason') if analysis.get('skipped') else None,
+            analysis.get('prefilter_score') if analysis.get('skipped') else None,
+            bool(analysis.get('analysis_failed', False))
+        )
+
+    @property
+    def skipped(self) -> bool:
+        return self.skip_reason is not None
+
+    def to_dict(self) -> Dict:
+        """expand to the report's analysis dictionary."""
+        analysis = {
+            'is_controversial': self.is_controversial,
+            'controversy_score': self.controversy_score,
+            'reasons': self.reasons,
+            'topics': self.topics
+        }
+        if self.skipped:
+            analysis['skipped'] = True
+            analysis['skip_reason'] = self.skip_reason
+            analysis['prefilter_score'] = self.prefilter_score
+        if self.analysis_failed:
+            analysis['analysis_failed'] = True
+        return analysis
+
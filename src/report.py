@@ -0,0 +1,241 @@
+"""
+report shapes.
+the normalized report keeps one row per tweet in 'tweets' and points at them
+from a keyword -> [tweet_id] index and a list of controversial tweet ids. the
+legacy shape repeats every tweet once per matched keyword in 'tweets' and once
+more in 'controversial_tweets'. reports of either shape can be converted into
+the other, so readers accept both. a report held in memory keeps one
+(Tweet, Analysis) pair per tweet and becomes rows only when it is written.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from records import METRIC_FIELDS, Analysis, Tweet
+
+NORMALIZED_FORMAT = 'normalized'
+
+# top-level keys that only exist in one of the two shapes
+SHAPE_KEYS = ('report_format', 'tweets', 'keyword_index', 'controversial_ids', 'controversial_tweets')
+
+# one analyzed tweet; a report held in memory keeps these in 'tweets' instead of row dicts
+Entry = Tuple[Tweet, Analysis]
+
+
+def tweet_row(tweet: Tweet, analysis: Analysis) -> Dict:
+    """one row of the normalized tweets table."""
+    return {
+        'tweet_id': tweet.id,
+        'text': tweet.text,
+        'created_at': tweet.created_at,
+        'matched_keywords': tweet.matched_keywords,
+        'public_metrics': tweet.public_metrics,
+        'analysis': analysis.to_dict()
+    }
+
+
+def tweet_from_row(row: Dict) -> Tweet:
+    """rebuild the Tweet record of a report row (either shape), e.g. to analyze it again."""
+    metrics = row.get('public_metrics') or {}
+    return Tweet(
+        int(row['tweet_id']),
+        row['text'],
+        row.get('created_at'),
+        *(int(metrics.get(name, 0) or 0) for name in METRIC_FIELDS),
+        list(row.get('matched_keywords') or [])
+    )
+
+
+class ReportIndex:
+    """keyword and controversy indexes plus summary counts, built one tweet at a time."""
+
+    def __init__(self, keywords: List[str]):
+        """
+        args:
+            keywords: keywords that were searched (sets the index order)
+        """
+        self.keyword_index = {keyword: [] for keyword in keywords}
+        self.controversial_ids = []
+        self.total = 0
+        self.skipped = 0
+        self.failed = 0
+        self.newest_id = None
+
+    def add(self, tweet: Tweet, analysis: Analysis):
+        self.total += 1
+        for keyword in tweet.matched_keywords:
+            self.keyword_index.setdefault(keyword, []).append(tweet.id)
+        if analysis.is_controversial:
+            self.controversial_ids.append(tweet.id)
+        if analysis.skipped:
+            self.skipped += 1
+        if analysis.analysis_failed:
+            self.failed += 1
+        if self.newest_id is None or tweet.id > self.newest_id:
+            self.newest_id = tweet.id
+
+    def fields(self) -> Dict:
+        """the normalized report's index and count keys (everything but the tweets table)."""
+        return {
+            'report_format': NORMALIZED_FORMAT,
+            'controversial_count': len(self.controversial_ids),
+            'keyword_index': {keyword: ids for keyword, ids in self.keyword_index.items() if ids},
+            'controversial_ids': self.controversial_ids,
+            'summary': {
+                'total_analyzed': self.total,
+                'controversial': len(self.controversial_ids),
+                # failed analyses have no verdict, so they are neither controversial nor not
+                'non_controversial': self.total - len(self.controversial_ids) - self.failed,
+                'analysis_failed': self.failed,
+                'skipped_by_prefilter': self.skipped
+            }
+        }
+
+
+def normalized_fields(entries: List[Entry], keywords: List[str]) -> Dict:
+    """
+    the tweet entries, indexes and counts of a normalized report.
+    args:
+        entries: one (Tweet, Analysis) pair per tweet, in report order
+        keywords: keywords that were searched (sets the index order)
+    returns:
+        dictionary of the normalized report's tweet-related keys
+    """
+    index = ReportIndex(keywords)
+    for tweet, analysis in entries:
+        index.add(tweet, analysis)
+    fields = index.fields()
+    fields['tweets'] = entries
+    return fields
+
+
+def with_entries(results: Dict, entries: List[Entry]) -> Dict:
+    """copy of a report (either shape) with its tweets replaced by the given entries, indexed anew."""
+    return _replace_shape(results, normalized_fields(entries, results.get('keywords_searched', [])))
+
+
+def report_entries(report: Dict) -> List[Entry]:
+    """
+    the (Tweet, Analysis) pairs of a report read from disk.
+    legacy reports repeat a tweet once per keyword; each tweet is returned once.
+    """
+    entries = {}
+    for row in report.get('tweets', []):
+        tweet_id = int(row['tweet_id'])
+        if tweet_id not in entries:
+            entries[tweet_id] = (tweet_from_row(row), Analysis.from_dict(row['analysis']))
+    return list(entries.values())
+
+
+def serialize_report(results: Dict) -> Dict:
+    """the json form of a report held in memory: its entries become normalized tweet rows."""
+    return dict(results, tweets=[tweet_row(tweet, analysis) for tweet, analysis in results['tweets']])
+
+
+def expand_report(results: Dict) -> Dict:
+    """
+    the json form of a report held in memory, in the legacy expanded shape.
+    every tweet gets one row per matched keyword ('unknown' if it matched none), and its
+    controversial entry lists it once under its first matched keyword. all rows of one
+    tweet share the same metrics and analysis dictionaries.
+    """
+    rows = []
+    controversial_tweets = []
+    failed = 0
+    for tweet, analysis in results['tweets']:
+        row = tweet_row(tweet, analysis)
+        for keyword in tweet.matched_keywords or ['unknown']:
+            rows.append(_legacy_row(row, keyword))
+            failed += analysis.analysis_failed
+        if analysis.is_controversial:
+            controversial_tweets.append(_legacy_row(row, _primary_keyword(row)))
+
+    return _replace_shape(results, {
+        'controversial_count': len(controversial_tweets),
+        'tweets': rows,
+        'controversial_tweets': controversial_tweets,
+        'summary': dict(results['summary'], total_analyzed=len(rows), analysis_failed=failed,
+                        non_controversial=len(rows) - len(controversial_tweets) - failed)
+    })
+
+
+def controversial_entries(results: Dict) -> List[Dict]:
+    """controversial tweets of a report held in memory, as legacy rows with their primary 'keyword'."""
+    rows = [tweet_row(tweet, analysis) for tweet, analysis in results['tweets'] if analysis.is_controversial]
+    return [_legacy_row(row, _primary_keyword(row)) for row in rows]
+
+
+def _replace_shape(results: Dict, fields: Dict) -> Dict:
+    # swap the shape-specific keys for fields, keeping the other keys where they were
+    replaced = {}
+    for key, value in results.items():
+        if key in SHAPE_KEYS or key in fields:
+            replaced.update(fields)
+        else:
+            replaced[key] = value
+    replaced.update(fields)
+    return replaced
+
+
+def _primary_keyword(row: Dict) -> str:
+    return row['matched_keywords'][0] if row['matched_keywords'] else 'unknown'
+
+
+def _legacy_row(row: Dict, keyword: str) -> Dict:
+    # keep the legacy key order: tweet_id, text, created_at, keyword, matched_keywords, ...
+    return {
+        'tweet_id': row['tweet_id'],
+        'text': row['text'],
+        'created_at': row['created_at'],
+        'keyword': keyword,
+        'matched_keywords': row['matched_keywords'],
+        'public_metrics': row['public_metrics'],
+        'analysis': row['analysis']
+    }
+
+
+class JsonlReportWriter:
+    """
+    streams a normalized report as json lines: one {"record": "tweet", ...} line per
+    analyzed tweet as soon as it completes, then a {"record": "summary", ...} trailer
+    with everything else. lines are flushed every flush_every tweets, so a crash
+    loses at most that many and the file can be tailed while the scan runs.
+    """
+
+    def __init__(self, path: str, flush_every: int = 100):
+        """
+        args:
+            path: output jsonl file (overwritten)
+            flush_every: tweets written between flushes
+        """
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self._file = open(path, 'w', encoding='utf-8')
+        self._unflushed = 0
+
+    def _write(self, record: Dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def write_tweet(self, tweet: Tweet, analysis: Analysis):
+        """append one normalized tweet row."""
+        self._write({'record': 'tweet', **tweet_row(tweet, analysis)})
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        self._unflushed = 0
+
+    def close(self, results: Optional[Dict] = None):
+        """
+        write the summary trailer (the report without its tweets table) and close the file.
+        args:
+            results: final report; None closes without a trailer (e.g. after an error)
+        """
+        if results is not None:
+            self._write({'record': 'summary', **{key: value for key, value in results.items() if key != 'tweets'}})
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
@@ -0,0 +1,218 @@
+"""
+adaptive concurrency control for openai requests.
+caps the number of concurrent calls with an aimd limit (grow by one after a
+window of clean responses, halve on a 429), retries with exponential backoff
+and jitter honoring retry-after, and tracks the requests/tokens-per-minute
+budget reported in the x-ratelimit-* response headers.
+"""
+
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Mapping, Optional
+
+import openai
+
+from metrics import METRICS
+
+# transient failures worth retrying without counting against the concurrency limit
+TRANSIENT_ERRORS = (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """parse openai reset durations such as '20ms', '1s' or '6m0s' into seconds."""
+    if not value:
+        return None
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """read retry-after-ms / retry-after from an error response, if present."""
+    if headers is None:
+        return None
+    for name, scale in (('retry-after-ms', 0.001), ('retry-after', 1)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue
+    return None
+
+
+class AdaptiveThrottle:
+    def __init__(self, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 base_delay: float = 1.0, max_delay: float = 60.0, max_retries: int = 6,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        args:
+            initial_limit: concurrent requests allowed at start
+            min_limit: floor for the concurrency limit after repeated 429s
+            max_limit: ceiling the limit may ramp up to
+            base_delay: first backoff delay in seconds
+            max_delay: cap on a single backoff delay
+            max_retries: retries per request before the error is raised
+            clock: monotonic time source (injectable for tests and benchmarks)
+            sleep: blocks for a number of seconds
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial_limit))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self._clock = clock
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        # rolling one-minute window of (time, tokens) for observed throughput
+        self._recent = deque()
+        # latest budget reported by the api
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.limit_requests = None
+        self.limit_tokens = None
+        self.rate_limited = 0
+        self.retries = 0
+        self.total_sleep = 0.0
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                wait = self._paused_until - self._clock()
+                if wait <= 0 and self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _on_success(self):
+        # additive increase: one step up per window of `limit` clean responses
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def _on_rate_limited(self, delay: float):
+        # multiplicative decrease, and hold every caller until the backoff has passed
+        with self._cond:
+            self.rate_limited += 1
+            self.limit = max(self.min_limit, self.limit // 2)
+            self._successes = 0
+            self._paused_until = max(self._paused_until, self._clock() + delay)
+
+    def backoff_delay(self, attempt: int, retry_after: float = None) -> float:
+        """exponential backoff with equal jitter, or the server's retry-after when it gave one."""
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return cap / 2 + random.uniform(0, cap / 2)
+
+    def observe(self, headers: Optional[Mapping[str, str]], tokens: int = 0):
+        """
+        record a response's rate-limit headers and token usage.
+        when the reported request or token budget is nearly spent, callers are held
+        until the window resets instead of running into 429s.
+        """
+        now = self._clock()
+        with self._cond:
+            self._recent.append((now, tokens))
+            while self._recent and now - self._recent[0][0] > 60:
+                self._recent.popleft()
+            if headers is None:
+                return
+
+            for attr, name in (('remaining_requests', 'x-ratelimit-remaining-requests'),
+                               ('remaining_tokens', 'x-ratelimit-remaining-tokens'),
+                               ('limit_requests', 'x-ratelimit-limit-requests'),
+                               ('limit_tokens', 'x-ratelimit-limit-tokens')):
+                value = headers.get(name)
+                if value is not None and value.isdigit():
+                    setattr(self, attr, int(value))
+
+            if self.remaining_requests is not None and self.remaining_requests < self._in_flight:
+                reset = parse_duration(headers.get('x-ratelimit-reset-requests'))
+                if reset:
+                    self._paused_until = max(self._paused_until, now + reset)
+            if self.remaining_tokens is not None and tokens and self.remaining_tokens < tokens * self._in_flight:
+                reset = parse_duration(headers.get('x-ratelimit-reset-tokens'))
+                if reset:
+                    self._paused_until = max(self._paused_until, now + reset)
+
+    def call(self, request: Callable):
+        """
+        run request() under the concurrency limit, retrying rate limits and transient errors.
+        args:
+            request: zero-argument callable issuing one api call
+        returns:
+            whatever request() returns
+        raises:
+            the last openai error once max_retries is exhausted
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            try:
+                result = request()
+            except openai.RateLimitError as e:
+                self._release()
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt, retry_after_seconds(getattr(e.response, 'headers', None)))
+                self._on_rate_limited(delay)
+                self._backoff(delay)
+                continue
+            except TRANSIENT_ERRORS:
+                self._release()
+                if attempt == self.max_retries:
+                    raise
+                self._backoff(self.backoff_delay(attempt))
+                continue
+            except Exception:
+                self._release()
+                raise
+            self._release()
+            self._on_success()
+            return result
+
+    def _backoff(self, delay: float):
+        with self._cond:
+            self.retries += 1
+            self.total_sleep += delay
+        METRICS.record('llm_backoff_sleep', delay)
+        self._sleep(delay)
+
+    def stats(self) -> Dict:
+        """current limit, retry counters and observed / reported per-minute throughput."""
+        with self._cond:
+            now = self._clock()
+            recent = [(t, tokens) for t, tokens in self._recent if now - t <= 60]
+            return {
+                'concurrency_limit': self.limit,
+                'rate_limited': self.rate_limited,
+                'retries': self.retries,
+                'backoff_seconds': round(self.total_sleep, 3),
+                'observed_requests_per_minute': len(recent),
+                'observed_tokens_per_minute': sum(tokens for _, tokens in recent),
+                'limit_requests_per_minute': self.limit_requests,
+                'limit_tokens_per_minute': self.limit_tokens
+            }
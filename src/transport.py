@@ -0,0 +1,105 @@
+"""
+shared http transport.
+one keep-alive connection pool per api (x and openai), sized to the run's
+concurrency and with explicit connect/read timeouts. a single Transport is
+handed to every TwitterSearcher and ControversyAnalyzer of a run, so
+concurrent workers and successive profiles reuse open tls connections
+instead of handshaking for each client or request.
+"""
+
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+# x search pages come back quickly; llm completions can take much longer
+DEFAULT_X_READ_TIMEOUT = 30.0
+DEFAULT_LLM_READ_TIMEOUT = 120.0
+# idle seconds before a pooled openai connection is closed
+KEEPALIVE_EXPIRY_SECONDS = 30.0
+
+
+class TimeoutSession(requests.Session):
+    """requests session that applies a default timeout to every request (tweepy passes none)."""
+
+    def __init__(self, timeout: Tuple[float, float]):
+        """
+        args:
+            timeout: (connect, read) seconds used when a request does not set its own
+        """
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+class Transport:
+    def __init__(self, x_connections: int = 4, llm_connections: int = 4,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 x_read_timeout: float = DEFAULT_X_READ_TIMEOUT,
+                 llm_read_timeout: float = DEFAULT_LLM_READ_TIMEOUT,
+                 http2: bool = False):
+        """
+        args:
+            x_connections: pooled connections to the x api (concurrent searches)
+            llm_connections: pooled connections to the openai api (concurrent llm requests)
+            connect_timeout: seconds allowed to open a connection
+            x_read_timeout: seconds allowed between bytes of an x api response
+            llm_read_timeout: seconds allowed between bytes of an openai response
+            http2: multiplex openai requests over http/2 (needs the h2 package)
+        """
+        self.x_connections = max(1, x_connections)
+        self.llm_connections = max(1, llm_connections)
+        self.connect_timeout = connect_timeout
+        self.x_read_timeout = x_read_timeout
+        self.llm_read_timeout = llm_read_timeout
+        self.http2 = http2
+        self._x_session: Optional[requests.Session] = None
+        self._openai_http_client = None
+
+    @property
+    def x_session(self) -> requests.Session:
+        """requests session for tweepy clients, built on first use and shared afterwards."""
+        if self._x_session is None:
+            session = TimeoutSession((self.connect_timeout, self.x_read_timeout))
+            # every x call goes to one host, so one pool sized to the concurrency is enough
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.x_connections)
+            session.mount('https://', adapter)
+            self._x_session = session
+        return self._x_session
+
+    @property
+    def openai_http_client(self):
+        """httpx client for openai.OpenAI(http_client=...), built on first use and shared afterwards."""
+        if self._openai_http_client is None:
+            import openai
+
+            # limits and timeouts must be the classes of the http package the installed sdk is built
+            # on (httpx, or httpx2 in newer releases), so take them from the sdk's public exports
+            limits_class = type(openai.DEFAULT_CONNECTION_LIMITS)
+            if self.http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError as e:
+                    raise ImportError('--http2 needs the h2 package: pip install "httpx[http2]"') from e
+            self._openai_http_client = openai.DefaultHttpxClient(
+                limits=limits_class(max_connections=self.llm_connections,
+                                    max_keepalive_connections=self.llm_connections,
+                                    keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS),
+                timeout=openai.Timeout(self.llm_read_timeout, connect=self.connect_timeout),
+                http2=self.http2
+            )
+        return self._openai_http_client
+
+    def close(self):
+        """close both pools (open connections are dropped)."""
+        if self._x_session is not None:
+            self._x_session.close()
+            self._x_session = None
+        if self._openai_http_client is not None:
+            self._openai_http_client.close()
+            self._openai_http_client = None